@@ -2,6 +2,9 @@ from .log_utilities import *
 from .thread_utilities import *
 from .singletons import *
 from .sql_interface import *
+from .blob_store import *
+from .async_sql_interface import *
+from .sharded_sql_interface import *
 from .file_utilities import *
 from .string_utilities import *
 
@@ -0,0 +1,164 @@
+"""
+asyncio front-end for the SQL interface.
+
+Every call is run off the event loop: writes (and, unless a connection pool
+is configured, all work) go through one dedicated database thread, since
+SQLite connections are bound to the thread that created them. With a
+configured 'pool size', reads are additionally spread over a thread pool
+of the same size.
+"""
+import asyncio
+import functools
+
+from concurrent.futures import ThreadPoolExecutor
+
+from .sql_interface import SQLInterface
+
+
+class AsyncSQLInterface:
+    def __init__(self, config: dict = None, log_name: str = None):
+        """
+        Accepts the same configuration as SQLInterface.
+        The connection is opened by `connect()` (or `async with`).
+        """
+        assert (
+            config is not None
+        ), "A configuration for the database must be supplied, Aborting"
+        self.config = config
+        self.log_name = log_name
+        self.interface = None
+        self._writer = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="AsyncSQLInterface"
+        )
+        pool_size = config.get("pool size")
+        self._readers = (
+            ThreadPoolExecutor(
+                max_workers=pool_size, thread_name_prefix="AsyncSQLInterfaceReader"
+            )
+            if pool_size
+            else self._writer
+        )
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def _run(self, executor, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            executor, functools.partial(func, *args, **kwargs)
+        )
+
+    async def _read(self, func, *args, **kwargs):
+        return await self._run(self._readers, func, *args, **kwargs)
+
+    async def _write(self, func, *args, **kwargs):
+        return await self._run(self._writer, func, *args, **kwargs)
+
+    async def connect(self):
+        if self.interface is None:
+            self.interface = await self._write(SQLInterface, self.config, self.log_name)
+        return self
+
+    async def close(self):
+        if self.interface is not None:
+            await self._write(self.interface.close)
+            self.interface = None
+        if self._readers is not self._writer:
+            self._readers.shutdown(wait=True)
+        self._writer.shutdown(wait=True)
+
+    @property
+    def meta_info(self):
+        return self.interface.meta_info
+
+    async def get_tables(self):
+        return await self._read(self.interface.get_tables)
+
+    async def retrieve_metadata(self):
+        return await self._write(self.interface.retrieve_metadata)
+
+    async def get_all_table_fields(self, table: str):
+        return await self._read(self.interface.get_all_table_fields, table)
+
+    async def get_data_entry_fields(self, table: str, fields: list = None):
+        return await self._read(self.interface.get_data_entry_fields, table, fields)
+
+    async def insert_rows(self, table: str, fields: list, data, batch_size: int = None):
+        return await self._write(
+            self.interface.insert_rows, table, fields, data, batch_size
+        )
+
+    async def upsert_rows(self, table: str, fields: list, data, batch_size: int = None):
+        return await self._write(
+            self.interface.upsert_rows, table, fields, data, batch_size
+        )
+
+    async def update_rows(self, table: str, update_info: dict):
+        return await self._write(self.interface.update_rows, table, update_info)
+
+    async def delete_rows(self, table: str, fields: list, data, batch_size: int = None):
+        return await self._write(
+            self.interface.delete_rows, table, fields, data, batch_size
+        )
+
+    async def import_dataframe(self, table: str, frames, **kwargs):
+        return await self._write(self.interface.import_dataframe, table, frames, **kwargs)
+
+    async def import_csv(self, table: str, path: str, **kwargs):
+        return await self._write(self.interface.import_csv, table, path, **kwargs)
+
+    async def flush(self):
+        return await self._write(self.interface.flush)
+
+    async def retrieve_rows(self, query: str, params=()):
+        return await self._read(self.interface.retrieve_rows, query, params)
+
+    async def execute_pandas_query(self, command: str):
+        return await self._read(self.interface.execute_pandas_query, command)
+
+    async def fetch_columns(
+        self, query: str, params=(), table: str = None, batch_size: int = 10000
+    ):
+        return await self._read(
+            self.interface.fetch_columns, query, params, table, batch_size
+        )
+
+    async def fetch_dataframe(
+        self, query: str, params=(), table: str = None, batch_size: int = 10000
+    ):
+        return await self._read(
+            self.interface.fetch_dataframe, query, params, table, batch_size
+        )
+
+    async def parallel_scan(self, table: str, query: str = None, params=(), **kwargs):
+        return await self._read(
+            self.interface.parallel_scan, table, query, params, **kwargs
+        )
+
+    async def iter_rows(
+        self, query: str, params=(), batch_size: int = 1000, batches: bool = False
+    ):
+        """
+        Asynchronously stream the results of `query`; see SQLInterface.iter_rows.
+        Only one batch of rows is held in memory at a time.
+        """
+        # Each batch is fetched on the same thread, as required by non-pooled connections
+        executor = self._writer
+        exhausted = object()
+        rows = self.interface.iter_rows(query, params, batch_size, batches=True)
+        try:
+            while True:
+                batch = await self._run(executor, next, rows, exhausted)
+                if batch is exhausted:
+                    return
+                if batches:
+                    yield batch
+                else:
+                    for row in batch:
+                        yield row
+        finally:
+            await self._run(executor, rows.close)
@@ -0,0 +1,179 @@
+"""
+Content-addressed storage for large payloads, kept as files alongside a database.
+
+Payloads are stored under the hash of their content (their accession ID), in
+fanned-out directories (eg, `ab/cd/abcd...`), so identical payloads are stored
+once and no single directory grows too large. Writes are atomic (a temporary
+file is moved into place), and reads are memory-mapped, so payloads are not
+copied into Python memory. Optionally, accessions are recorded in a database
+table (with reference counts) through an SQLInterface.
+"""
+import contextlib
+import hashlib
+import mmap
+import os
+import tempfile
+import time
+
+from .sql_interface import _quote, _statement
+
+# Read size when hashing/copying file-like payloads
+_CHUNK_SIZE = 2 ** 20
+
+
+class BlobStore:
+    def __init__(
+        self,
+        root: str,
+        interface=None,
+        table: str = "blob accessions",
+        fanout: int = 2,
+        algorithm: str = "sha256",
+    ):
+        """
+        root: Directory in which payloads are stored
+        interface: Optional SQLInterface, in which accessions are recorded
+        table: Name of the accession table (created if needed)
+        fanout: Number of directory levels (of two hex digits each) above each payload
+        algorithm: Content hash (any `hashlib` algorithm)
+        """
+        assert fanout >= 0, "Fan-out must be a non-negative integer"
+        hashlib.new(algorithm)  # Fail early on unknown algorithms
+        self.root = os.path.abspath(os.path.expanduser(root))
+        self.interface = interface
+        self.table = table
+        self.fanout = fanout
+        self.algorithm = algorithm
+        os.makedirs(self.root, exist_ok=True)
+        if interface is not None:
+            create_table = (
+                "CREATE TABLE IF NOT EXISTS {} ("
+                "accession TEXT PRIMARY KEY, "
+                "size INTEGER NOT NULL, "
+                "created REAL NOT NULL, "
+                "refs INTEGER NOT NULL DEFAULT 1);"
+            ).format(_quote(table))
+            interface._write(
+                table, _statement(create_table), kind="schema", deferrable=False
+            )
+
+    def path(self, accession: str):
+        """File path for an accession ID"""
+        assert all(
+            c in "0123456789abcdef" for c in accession
+        ), f"Invalid accession ID {accession}"
+        parts = [accession[2 * i : 2 * i + 2] for i in range(self.fanout)]
+        return os.path.join(self.root, *parts, accession)
+
+    def __contains__(self, accession: str):
+        return os.path.isfile(self.path(accession))
+
+    def put(self, payload):
+        """
+        Store `payload` (bytes-like, or a binary file-like object, read in chunks)
+        and return its accession ID. Identical payloads are stored only once.
+        """
+        digest = hashlib.new(self.algorithm)
+        fd, temporary_path = tempfile.mkstemp(dir=self.root, prefix=".incoming-")
+        size = 0
+        try:
+            with os.fdopen(fd, "wb") as fp:
+                if hasattr(payload, "read"):
+                    for chunk in iter(lambda: payload.read(_CHUNK_SIZE), b""):
+                        digest.update(chunk)
+                        fp.write(chunk)
+                        size += len(chunk)
+                else:
+                    payload = memoryview(payload).cast("B")
+                    digest.update(payload)
+                    fp.write(payload)
+                    size = len(payload)
+                fp.flush()
+                os.fsync(fp.fileno())
+            accession = digest.hexdigest()
+            target = self.path(accession)
+            if os.path.isfile(target):
+                os.unlink(temporary_path)
+            else:
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                os.chmod(temporary_path, 0o444)
+                os.replace(temporary_path, target)
+        except BaseException:
+            if os.path.exists(temporary_path):
+                os.unlink(temporary_path)
+            raise
+        if self.interface is not None:
+            self._record(accession, size)
+        return accession
+
+    def _record(self, accession: str, size: int):
+        command = (
+            "INSERT INTO {} (accession, size, created) VALUES (?, ?, ?) "
+            "ON CONFLICT (accession) DO UPDATE SET refs = refs + 1;"
+        ).format(_quote(self.table))
+
+        def record(cur):
+            cur.execute(command, (accession, size, time.time()))
+            return cur.rowcount
+
+        # Deferrable: the payload file is already in place
+        self.interface._write(self.table, record, kind="insert")
+
+    @contextlib.contextmanager
+    def open(self, accession: str):
+        """
+        Read-only, zero-copy view (a memoryview over a memory map) of a payload.
+        The view is released when the context exits.
+        """
+        path = self.path(accession)
+        if not os.path.isfile(path):
+            raise KeyError(f"No payload stored for accession {accession}")
+        with open(path, "rb") as fp:
+            if os.fstat(fp.fileno()).st_size == 0:
+                # Empty files cannot be memory-mapped
+                yield memoryview(b"")
+                return
+            with mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                view = memoryview(mapped)
+                try:
+                    yield view
+                finally:
+                    view.release()
+
+    def get(self, accession: str):
+        """Copy of a payload, as bytes (see `open` for zero-copy access)"""
+        with self.open(accession) as view:
+            return bytes(view)
+
+    def lookup(self, accession: str):
+        """Accession table entry, as (accession, size, created, refs), or None"""
+        assert self.interface is not None, "No database interface for this blob store"
+        command = "SELECT accession, size, created, refs FROM {} WHERE accession = ?;"
+        rows = self.interface.retrieve_rows(command.format(_quote(self.table)), (accession,))
+        return rows[0] if rows else None
+
+    def delete(self, accession: str):
+        """
+        Release a reference to a payload; the file is removed along with its last
+        reference (or immediately, without an accession table).
+        Returns True if the payload file was removed.
+        """
+        if self.interface is not None:
+            release = "UPDATE {} SET refs = refs - 1 WHERE accession = ?;"
+            remove = "DELETE FROM {} WHERE accession = ? AND refs <= 0;"
+
+            def delete(cur):
+                cur.execute(release.format(_quote(self.table)), (accession,))
+                cur.execute(remove.format(_quote(self.table)), (accession,))
+                return cur.rowcount
+
+            removed = self.interface._write(
+                self.table, delete, kind="delete", deferrable=False
+            )
+            if not removed:
+                return False
+        path = self.path(accession)
+        if not os.path.isfile(path):
+            return False
+        os.unlink(path)
+        return True
@@ -1,4 +1,48 @@
+import atexit
+import glob
+import gzip
 import logging
+import logging.handlers
+import os
+import queue
+import random
+import shutil
+import threading
+import time
+
+
+class LazyMessage:
+
+    """
+    Log message (or argument) computed only when a record is actually emitted,
+    eg `logger.debug("Rows: %s", lazy(summarize, rows))`. It is computed once,
+    however many handlers format the record.
+    """
+
+    __slots__ = ("func", "args", "kwargs", "_text")
+
+    def __init__(self, func, *args, **kwargs):
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self._text = None
+
+    def __str__(self):
+        if self._text is None:
+            self._text = str(self.func(*self.args, **self.kwargs))
+        return self._text
+
+
+def lazy(func, *args, **kwargs):
+    """
+    Defer `func(*args, **kwargs)` until a log record using it is formatted.
+
+    Prefer %-style arguments (`logger.debug("Query %s", query)`) for values
+    that are already at hand. Both cost only a level check when the level is
+    disabled; `Logger.isEnabledFor` caches its result per level, and the cache
+    is cleared whenever a level changes (`setLevel`, `logging.disable`).
+    """
+    return LazyMessage(func, *args, **kwargs)
 
 
 class DummyLogger(logging.Logger):
@@ -11,19 +55,28 @@ class DummyLogger(logging.Logger):
     def __init__(self, name):
         super().__init__(name)
 
-    def debug(self, msg):
+    def isEnabledFor(self, level):
+        return False
+
+    def debug(self, msg, *args, **kwargs):
+        ...
+
+    def info(self, msg, *args, **kwargs):
         ...
 
-    def info(self, msg):
+    def warning(self, msg, *args, **kwargs):
         ...
 
-    def warning(self, msg):
+    def error(self, msg, *args, **kwargs):
         ...
 
-    def error(self, msg):
+    def exception(self, msg, *args, **kwargs):
         ...
 
-    def critical(self, msg):
+    def critical(self, msg, *args, **kwargs):
+        ...
+
+    def log(self, level, msg, *args, **kwargs):
         ...
 
 
@@ -37,13 +90,423 @@ def _register_regular_logger():
 
 def create_silent_logger(log_name, config=None):
     _register_dummy_logger(DummyLogger)
-    _create_logger(log_name)
+    _create_logger(log_name, config)
     _register_regular_logger()
 
 
 def create_logger(log_name, config=None):
     _register_regular_logger()
-    _create_logger(log_name)
+    _create_logger(log_name, config)
+
+
+class BoundedQueueHandler(logging.handlers.QueueHandler):
+
+    """
+    Queue handler for a bounded queue, with a policy for when the queue is full:
+        'block': Wait for space in the queue
+        'drop': Discard the new record
+        'drop_oldest': Discard the oldest queued record
+    Records are queued unformatted; formatting is left to the listener's handlers.
+    """
+
+    _OVERFLOW_POLICIES = ("block", "drop", "drop_oldest")
+
+    def __init__(self, queue_size: int = 10000, overflow: str = "block"):
+        assert (
+            overflow in self._OVERFLOW_POLICIES
+        ), f"Queue overflow policy must be one of {self._OVERFLOW_POLICIES}"
+        super().__init__(queue.Queue(maxsize=queue_size))
+        self.overflow = overflow
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Records stay in-process, so need neither formatting nor pickling here
+        return record
+
+    def enqueue(self, record):
+        if self.overflow == "block":
+            self.queue.put(record)
+            return
+        while True:
+            try:
+                self.queue.put_nowait(record)
+                return
+            except queue.Full:
+                self.dropped += 1
+                if self.overflow == "drop":
+                    return
+            try:
+                self.queue.get_nowait()
+            except queue.Empty:
+                pass
+
+
+class _QueueListener(logging.handlers.QueueListener):
+    def enqueue_sentinel(self):
+        # Wait for space, rather than failing, when the queue is full
+        self.queue.put(self._sentinel)
+
+
+# Queue listeners (with their queue handlers) by logger name
+_queue_listeners = {}
+_queue_listeners_lock = threading.Lock()
+
+
+def stop_queue_logging(log_name=None):
+    """
+    Stop the queue listener of `log_name` [default: of every logger], after
+    it has handled all queued records. Registered to run at exit.
+    """
+    with _queue_listeners_lock:
+        names = list(_queue_listeners) if log_name is None else [log_name]
+        stopping = {
+            name: _queue_listeners.pop(name)
+            for name in names
+            if name in _queue_listeners
+        }
+    for name, (listener, handler) in stopping.items():
+        logging.getLogger(name).removeHandler(handler)
+        listener.stop()
+
+
+atexit.register(stop_queue_logging)
+
+
+class BufferedRotatingFileHandler(logging.FileHandler):
+
+    """
+    File handler that buffers formatted records in memory and writes them in
+    blocks: once `buffer_bytes` (approximately) are pending, every
+    `flush_interval` seconds (on a background thread), or immediately for
+    records at or above `flush_level`.
+
+    The file is rotated once it exceeds `max_bytes`, or every `rotate_interval`
+    seconds (0 disables either). Rotated segments are renamed with a timestamp
+    suffix (eg, `app.log.20240101-120000`), gzip-compressed on a background
+    thread if `compress` is set, and only the newest `backup_count` are kept.
+    """
+
+    def __init__(
+        self,
+        filename: str,
+        buffer_bytes: int = 64 * 1024,
+        flush_interval: float = 1.0,
+        flush_level=logging.ERROR,
+        max_bytes: int = 0,
+        rotate_interval: float = 0,
+        backup_count: int = 5,
+        compress: bool = True,
+        encoding: str = None,
+    ):
+        super().__init__(filename, mode="a", encoding=encoding)
+        self.buffer_bytes = buffer_bytes
+        self.flush_interval = flush_interval
+        self.flush_level = logging._checkLevel(flush_level)
+        self.max_bytes = max_bytes
+        self.rotate_interval = rotate_interval
+        self.backup_count = backup_count
+        self.compress = compress
+        self._pending = []
+        self._pending_bytes = 0
+        self._size = os.path.getsize(self.baseFilename)
+        self._opened_at = time.time()
+        self._last_segment = (None, 0)  # (timestamp, suffix) of the last rotation
+        self._stop = threading.Event()
+        self._segments = queue.Queue()
+        self._compressor = threading.Thread(
+            target=self._process_segments, name="LogSegmentCompressor", daemon=True
+        )
+        self._compressor.start()
+        self._flusher = None
+        if flush_interval:
+            self._flusher = threading.Thread(
+                target=self._flush_periodically, name="LogFileFlusher", daemon=True
+            )
+            self._flusher.start()
+
+    def emit(self, record):
+        # Called by `handle`, with the handler lock held. Errors (eg, a full
+        # disk) are reported like any handler's, never raised to the caller.
+        try:
+            message = self.format(record) + self.terminator
+            self._pending.append(message)
+            self._pending_bytes += len(message)
+            if (
+                self._pending_bytes >= self.buffer_bytes
+                or record.levelno >= self.flush_level
+            ):
+                self._write_pending()
+        except Exception:
+            self.handleError(record)
+
+    def _report(self, msg: str, *args):
+        """Report an error outside of `emit` (see logging.raiseExceptions)"""
+        self.handleError(logging.makeLogRecord({"msg": msg, "args": args}))
+
+    def _write_pending(self):
+        if self._pending and self.stream is not None:
+            try:
+                self.stream.write("".join(self._pending))
+                self.stream.flush()
+                self._size += self._pending_bytes
+            finally:
+                # Records that failed to be written are dropped, not retried,
+                # so the buffer cannot grow without bound
+                self._pending, self._pending_bytes = [], 0
+        if self._size and self._rotation_due():
+            self._rotate()
+
+    def _rotation_due(self):
+        if self.max_bytes and self._size >= self.max_bytes:
+            return True
+        elapsed = time.time() - self._opened_at
+        return bool(self.rotate_interval and elapsed >= self.rotate_interval)
+
+    def _rotate(self):
+        self.stream.close()
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        # Suffixes only increase within a second, even once segments are removed
+        last_stamp, last_suffix = self._last_segment
+        suffix = last_suffix + 1 if stamp == last_stamp else 0
+        while True:
+            segment = self._segment_name(stamp, suffix)
+            if not (os.path.exists(segment) or os.path.exists(f"{segment}.gz")):
+                break
+            suffix += 1
+        self._last_segment = (stamp, suffix)
+        try:
+            os.replace(self.baseFilename, segment)
+        finally:
+            # Reopened even if it could not be moved, so logging carries on
+            self.stream = self._open()
+            self._opened_at = time.time()
+        self._size = 0
+        self._segments.put(segment)
+
+    def _segment_name(self, stamp: str, suffix: int):
+        name = f"{self.baseFilename}.{stamp}"
+        return f"{name}.{suffix}" if suffix else name
+
+    def _segment_order(self, path: str):
+        """Sort key of a rotated segment: (timestamp, numeric suffix)"""
+        name = path[len(self.baseFilename) + 1 :]
+        if name.endswith(".gz"):
+            name = name[: -len(".gz")]
+        stamp, _, suffix = name.partition(".")
+        return stamp, int(suffix) if suffix.isdigit() else 0
+
+    def _process_segments(self):
+        while True:
+            segment = self._segments.get()
+            if segment is None:
+                return
+            try:
+                # Segments may be removed (as old) before their turn comes
+                if self.compress and os.path.exists(segment):
+                    with open(segment, "rb") as source:
+                        with gzip.open(f"{segment}.gz", "wb") as target:
+                            shutil.copyfileobj(source, target)
+                    os.unlink(segment)
+                self._remove_old_segments()
+            except Exception:
+                self._report("Failed to process rotated log segment %s", segment)
+
+    def _remove_old_segments(self):
+        segments = sorted(
+            glob.glob(glob.escape(self.baseFilename) + ".*"), key=self._segment_order
+        )
+        for segment in segments[: max(0, len(segments) - self.backup_count)]:
+            os.unlink(segment)
+
+    def _flush_periodically(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def flush(self):
+        self.acquire()
+        try:
+            self._write_pending()
+        except Exception:
+            # Keeps the periodic flusher alive, too
+            self._report("Failed to write buffered records to %s", self.baseFilename)
+        finally:
+            self.release()
+
+    def close(self):
+        self._stop.set()
+        if self._flusher is not None:
+            self._flusher.join()
+        self.flush()
+        super().close()
+        self._segments.put(None)
+        self._compressor.join()
+
+
+def _annotate(record, note: str):
+    """Append `note` to the message of `record`"""
+    record.msg = record.getMessage() + note
+    record.args = None
+
+
+class RateLimitFilter(logging.Filter):
+
+    """
+    Token-bucket rate limit per call site (source file and line): each site may
+    log `rate` records per second on average, in bursts of up to `burst`.
+    The first record let through after suppression notes how many were dropped.
+    """
+
+    def __init__(self, rate: float = 10.0, burst: float = None):
+        super().__init__()
+        assert rate > 0, "Rate limit must be positive"
+        self.rate = rate
+        self.burst = burst or max(rate, 1.0)
+        self._sites = {}  # (path, line) -> [tokens, last update, suppressed]
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        now = time.monotonic()
+        site = (record.pathname, record.lineno)
+        with self._lock:
+            state = self._sites.get(site)
+            if state is None:
+                state = self._sites[site] = [self.burst, now, 0]
+            state[0] = min(self.burst, state[0] + (now - state[1]) * self.rate)
+            state[1] = now
+            if state[0] < 1:
+                state[2] += 1
+                return False
+            state[0] -= 1
+            suppressed, state[2] = state[2], 0
+        if suppressed:
+            _annotate(record, f" [{suppressed} similar messages suppressed]")
+        return True
+
+
+class SamplingFilter(logging.Filter):
+
+    """
+    Let through a random fraction of records per level, eg {"DEBUG": 0.01};
+    levels not listed are always let through.
+    """
+
+    def __init__(self, rates: dict):
+        super().__init__()
+        self.rates = {}
+        for level, rate in rates.items():
+            assert 0 <= rate <= 1, "Sampling rates must be between 0 and 1"
+            self.rates[logging._checkLevel(level)] = rate
+
+    def filter(self, record):
+        rate = self.rates.get(record.levelno)
+        return rate is None or random.random() < rate
+
+
+class DuplicateCollapseFilter(logging.Filter):
+
+    """
+    Collapse a message repeated from the same call site: after the first record,
+    repeats are suppressed, and one is let through every `interval` seconds noting
+    how many times the message was repeated. The next different message from the
+    site notes the repeats of the previous one that were not yet reported.
+
+    Messages are compared by format string and arguments, without formatting
+    them, so suppressed records cost no formatting (and formatting is still left
+    to queue listeners). Arguments that do not compare equal between calls (eg,
+    `lazy` messages) are never collapsed.
+    """
+
+    def __init__(self, interval: float = 10.0):
+        super().__init__()
+        assert interval > 0, "Collapse interval must be positive"
+        self.interval = interval
+        self._sites = {}  # (path, line) -> [(msg, args), repeats, last let through]
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _same(message, other):
+        try:
+            return bool(message == other)
+        except Exception:
+            # Arguments without a plain equality (eg, numpy arrays)
+            return False
+
+    def filter(self, record):
+        now = time.monotonic()
+        site = (record.pathname, record.lineno)
+        message = (record.msg, record.args)
+        with self._lock:
+            state = self._sites.get(site)
+            if state is None or not self._same(state[0], message):
+                repeats = state[1] if state is not None else 0
+                self._sites[site] = [message, 0, now]
+                note = ""
+                if repeats:
+                    note = f" [previous message repeated {repeats} times]"
+            elif now - state[2] < self.interval:
+                state[1] += 1
+                return False
+            else:
+                repeats = state[1] + 1
+                state[1], state[2] = 0, now
+                note = f" [repeated {repeats} times]"
+        if note:
+            _annotate(record, note)
+        return True
+
+
+_FILTER_TYPES = (SamplingFilter, DuplicateCollapseFilter, RateLimitFilter)
+
+
+def _attach_filters(logger, config):
+    # Replace the filters of any previous configuration of this logger
+    for log_filter in list(logger.filters):
+        if isinstance(log_filter, _FILTER_TYPES):
+            logger.removeFilter(log_filter)
+    # Cheapest first: sampling, then duplicates, then rate limits
+    if config.get("sample_rates"):
+        logger.addFilter(SamplingFilter(config["sample_rates"]))
+    collapse = config.get("collapse_duplicates")
+    if collapse:
+        interval = 10.0 if collapse is True else collapse
+        logger.addFilter(DuplicateCollapseFilter(interval))
+    rate_limit = config.get("rate_limit")
+    if rate_limit:
+        if isinstance(rate_limit, dict):
+            rate, burst = rate_limit["rate"], rate_limit.get("burst")
+            logger.addFilter(RateLimitFilter(rate, burst))
+        else:
+            logger.addFilter(RateLimitFilter(rate_limit))
+
+
+def _file_handler(log_name, config):
+    """Handler for 'file_log', buffered/rotating if configured"""
+    rotating = config.get("file_max_bytes") or config.get("file_rotate_interval")
+    if not (config.get("file_buffered") or rotating):
+        return logging.FileHandler(f"{log_name}.log")
+    buffered = config.get("file_buffered", False)
+    return BufferedRotatingFileHandler(
+        f"{log_name}.log",
+        buffer_bytes=config.get("file_buffer_bytes", 64 * 1024) if buffered else 0,
+        flush_interval=config.get("file_flush_interval", 1.0) if buffered else 0,
+        flush_level=config.get("file_flush_level", logging.ERROR),
+        max_bytes=config.get("file_max_bytes", 0),
+        rotate_interval=config.get("file_rotate_interval", 0),
+        backup_count=config.get("file_backup_count", 5),
+        compress=config.get("file_compress", True),
+    )
+
+
+def _attach_queue(logger, handlers, config):
+    handler = BoundedQueueHandler(
+        config.get("queue_size", 10000), config.get("queue_overflow", "block")
+    )
+    listener = _QueueListener(handler.queue, *handlers, respect_handler_level=True)
+    stop_queue_logging(logger.name)
+    with _queue_listeners_lock:
+        _queue_listeners[logger.name] = (listener, handler)
+    logger.addHandler(handler)
+    listener.start()
 
 
 def create_sample_logger_suite():
@@ -72,6 +535,35 @@ def confirm_logger(logger: logging.Logger):
 
 def _create_logger(log_name, config=None):
 
+    """
+    Optional 'config' entries:
+        'level': Logging level [default DEBUG]
+        'format string': Format of log messages
+        'file_log': Log to `<log_name>.log`
+        'file_buffered': Buffer file records in memory, written in blocks
+        'file_buffer_bytes': Buffered size that triggers a write [default 64 KiB]
+        'file_flush_interval': Longest time a buffered record waits, in seconds
+            [default 1]
+        'file_flush_level': Records at or above this level are written at once
+            [default ERROR]
+        'file_max_bytes': Rotate the log file once larger than this
+        'file_rotate_interval': Rotate the log file after this many seconds
+        'file_backup_count': Number of rotated log files kept [default 5]
+        'file_compress': gzip rotated log files [default True]
+        'stdout_log': Log to the console [default True]
+        'queue_log': Hand records to the handlers above through a queue, handled
+            on a background thread, so logging calls never wait on I/O
+        'queue_size': Maximum number of queued records [default 10000]
+        'queue_overflow': When the queue is full, 'block' [default], 'drop' the
+            new record or 'drop_oldest' queued record
+        'sample_rates': Fraction of records let through, by level
+            (eg, {"DEBUG": 0.01})
+        'collapse_duplicates': Collapse repeats of a message from one call site,
+            summarized every N seconds (`True`: every 10 s)
+        'rate_limit': Records per second allowed from each call site, or
+            {"rate": ..., "burst": ...}
+    """
+
     if config is None:
 
         print(
@@ -87,16 +579,24 @@ def _create_logger(log_name, config=None):
         formatter = logging.Formatter(config["format string"])
     else:
         formatter = get_formatter(2)
+    handlers = []
     if "file_log" in config and config["file_log"]:
-        fh = logging.FileHandler(f"{log_name}.log")
+        fh = _file_handler(log_name, config)
         fh.setFormatter(formatter)
         fh.setLevel(level)
-        logger.addHandler(fh)
+        handlers.append(fh)
     if "stdout_log" not in config or config["stdout_log"]:
         sh = logging.StreamHandler()
         sh.setFormatter(formatter)
         sh.setLevel(level)
-        logger.addHandler(sh)
+        handlers.append(sh)
+    _attach_filters(logger, config)
+    if config.get("queue_log"):
+        # Handlers run on a background thread, fed through a bounded queue
+        _attach_queue(logger, handlers, config)
+    else:
+        for handler in handlers:
+            logger.addHandler(handler)
 
 
 def get_formatter(fmt):
@@ -0,0 +1,429 @@
+"""
+Key-sharded front-end for the SQL interface.
+
+Rows are spread over several database files (shards), each with the same schema,
+by hashing the values of each table's primary key (or a configured shard key).
+Writes are routed to the shard owning each row; reads are run on every shard in
+parallel and their results merged. Each shard is a full SQLInterface driven by
+its own database thread, so shards are written (and maintained) independently.
+"""
+import heapq
+import os
+import re
+import threading
+import zlib
+
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from .sql_interface import SQLInterface, _statement
+
+
+def _total(results: list):
+    """
+    Sum of per-shard write results; in write-buffer mode (where writes return
+    Futures), a Future of the sum
+    """
+    futures = [result for result in results if isinstance(result, Future)]
+    if not futures:
+        return sum(results)
+    total = Future()
+    remaining = [len(futures)]
+    lock = threading.Lock()
+
+    def resolved(_):
+        with lock:
+            remaining[0] -= 1
+            if remaining[0]:
+                return
+        errors = [f.exception() for f in futures if f.exception() is not None]
+        if errors:
+            total.set_exception(errors[0])
+        else:
+            total.set_result(
+                sum(r.result() if isinstance(r, Future) else r for r in results)
+            )
+
+    for future in futures:
+        future.add_done_callback(resolved)
+    return total
+
+
+# Text that SQLite converts to a number in columns of numeric affinity
+_INTEGER_TEXT = re.compile(r"\s*[+-]?\d+\s*")
+_REAL_TEXT = re.compile(r"\s*[+-]?(\d+\.?\d*|\.\d+)([eE][+-]?\d+)?\s*")
+
+
+def _affinity(declared_type: str):
+    """SQLite column affinity of a declared column type"""
+    declared_type = (declared_type or "").upper()
+    if "INT" in declared_type:
+        return "INTEGER"
+    if any(t in declared_type for t in ("CHAR", "CLOB", "TEXT")):
+        return "TEXT"
+    if "BLOB" in declared_type or not declared_type:
+        return "BLOB"
+    if any(t in declared_type for t in ("REAL", "FLOA", "DOUB")):
+        return "REAL"
+    return "NUMERIC"
+
+
+def _shard_value(value, affinity: str = "BLOB"):
+    """
+    `value` as SQLite stores it in a column of `affinity`, so that values stored
+    alike hash alike whatever their Python type (eg, 5, np.int64(5), 5.0 and "5"
+    in an INTEGER column; 5 and "5", but not 5.0, in a TEXT column)
+    """
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, bool):
+        value = int(value)
+    if affinity == "TEXT":
+        return str(value) if isinstance(value, (int, float)) else value
+    if affinity != "BLOB" and isinstance(value, str):
+        if _INTEGER_TEXT.fullmatch(value):
+            value = int(value)
+        elif _REAL_TEXT.fullmatch(value):
+            value = float(value)
+    # Integers and whole reals compare (and so, as keys, conflict) as equal
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def _shard_hash(values: tuple):
+    """Stable (between runs and processes) hash of a tuple of (stored) key values"""
+    digest = 0
+    for value in values:
+        if isinstance(value, (bytes, bytearray, memoryview)):
+            encoded = b"b" + bytes(value)
+        else:
+            encoded = repr(value).encode()
+        digest = zlib.crc32(encoded + b"\x1f", digest)
+    return digest
+
+
+class ShardedSQLInterface:
+    def __init__(self, config: dict = None, log_name: str = None):
+        """
+        Accepts the same configuration as SQLInterface, with:
+            'shards': Number of database files. Shard `i` of 'db file' `name.db`
+                is stored as `name.shard{i}.db`, and is created from 'db config'.
+        Optionally:
+            'shard keys': Mapping of table name to the fields its rows are sharded
+                on [default: the table's primary key]. Use this to keep related
+                rows (eg, a foreign key and the row it references) on one shard.
+
+        Every other option (pooling, caching, write buffering, ...) applies to each
+        shard. Rows of tables without a key (and without 'shard keys') are dealt
+        round-robin over the shards, and updated or deleted on every shard.
+        The shard count must not change once data has been written.
+        """
+        assert (
+            config is not None
+        ), "A configuration for the database must be supplied, Aborting"
+        shards = config.get("shards")
+        assert (
+            isinstance(shards, int) and shards > 0
+        ), "'shards' must be a positive integer"
+        self.config = config
+        self.shard_keys = dict(config.get("shard keys", {}))
+        self._dealt = 0  # Rows of keyless tables dealt so far
+        self._lock = threading.Lock()
+        stem, extension = os.path.splitext(config["db file"])
+        self._executors = [
+            ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"SQLShard{i}")
+            for i in range(shards)
+        ]
+        # Each shard is created (and used) on its own thread
+        self.shards = [
+            executor.submit(
+                SQLInterface,
+                {**config, "db file": f"{stem}.shard{i}{extension}"},
+                log_name,
+            )
+            for i, executor in enumerate(self._executors)
+        ]
+        self.shards = [future.result() for future in self.shards]
+        self.logger = self.shards[0].logger
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self._broadcast(lambda shard: shard.close())
+        for executor in self._executors:
+            executor.shutdown(wait=True)
+
+    @property
+    def meta_info(self):
+        """Snapshot of the (shared) table meta-information"""
+        return self._first(
+            lambda shard: {"tables": dict(shard.meta_info["tables"])}
+        )
+
+    def _run(self, index: int, func, *args, **kwargs):
+        """Run `func(shard, ...)` on the thread of shard `index`; returns a Future"""
+        return self._executors[index].submit(func, self.shards[index], *args, **kwargs)
+
+    def _first(self, func, *args, **kwargs):
+        """Result of `func(shard, ...)` on the first shard (for schema queries)"""
+        return self._run(0, func, *args, **kwargs).result()
+
+    def _broadcast(self, func, *args, **kwargs):
+        """Results of `func(shard, ...)` on every shard (run in parallel), in shard order"""
+        futures = [
+            self._run(index, func, *args, **kwargs) for index in range(len(self.shards))
+        ]
+        return [future.result() for future in futures]
+
+    def _routed(self, parts: list, func, *args, **kwargs):
+        """Results of `func(shard, part, ...)` on every shard with a non-empty part"""
+        futures = [
+            self._run(index, func, part, *args, **kwargs)
+            for index, part in enumerate(parts)
+            if part
+        ]
+        return [future.result() for future in futures]
+
+    def shard_fields(self, table: str):
+        """
+        Fields whose values decide which shard holds a row of `table`
+        (none for keyless tables, whose rows are dealt round-robin)
+        """
+        if table in self.shard_keys:
+            return list(self.shard_keys[table])
+        info = self._first(lambda shard: shard.meta_info["tables"][table])
+        return list(info["keys"])
+
+    def _shard_affinities(self, table: str, fields: list):
+        """Column affinities of `fields` of `table`"""
+        info = self._first(lambda shard: shard.meta_info["tables"][table]["fields"])
+        return [_affinity(info[field][1]) for field in fields]
+
+    def shard_index(self, table: str, values: tuple, affinities: list = None):
+        """
+        Shard holding the row of `table` with shard field values `values`.
+        Values are hashed as stored, given the fields' declared types.
+        """
+        if affinities is None:
+            affinities = self._shard_affinities(table, self.shard_fields(table))
+        stored = tuple(map(_shard_value, values, affinities))
+        return _shard_hash(stored) % len(self.shards)
+
+    def _partition(self, table: str, fields: list, data):
+        """Split rows of `data` (with columns `fields`) by shard"""
+        shard_fields = self.shard_fields(table)
+        assert set(shard_fields).issubset(
+            fields
+        ), f"Rows of {table} must include its shard fields: {shard_fields}"
+        parts = [[] for _ in self.shards]
+        if not shard_fields:
+            data = list(data)
+            with self._lock:
+                start = self._dealt
+                self._dealt += len(data)
+            for i, row in enumerate(data, start):
+                parts[i % len(parts)].append(row)
+            return parts
+        positions = [fields.index(field) for field in shard_fields]
+        affinities = self._shard_affinities(table, shard_fields)
+        for row in data:
+            index = self.shard_index(table, [row[i] for i in positions], affinities)
+            parts[index].append(row)
+        return parts
+
+    # Schema/meta-information (identical on every shard)
+
+    def get_tables(self):
+        return self._first(lambda shard: shard.get_tables())
+
+    def retrieve_metadata(self):
+        self._broadcast(lambda shard: shard.retrieve_metadata())
+
+    def get_all_table_fields(self, table: str):
+        return self._first(lambda shard: shard.get_all_table_fields(table))
+
+    def get_data_entry_fields(self, table: str, fields: list = None):
+        return self._first(lambda shard: shard.get_data_entry_fields(table, fields))
+
+    # Writes
+
+    def insert_rows(self, table: str, fields: list, data, batch_size: int = None):
+        """See SQLInterface.insert_rows; each shard writes its rows in one transaction"""
+        parts = self._partition(table, fields, data)
+        return _total(
+            self._routed(
+                parts,
+                lambda shard, part: shard.insert_rows(table, fields, part, batch_size),
+            )
+        )
+
+    def upsert_rows(self, table: str, fields: list, data, batch_size: int = None):
+        """See SQLInterface.upsert_rows; each shard writes its rows in one transaction"""
+        parts = self._partition(table, fields, data)
+        return _total(
+            self._routed(
+                parts,
+                lambda shard, part: shard.upsert_rows(table, fields, part, batch_size),
+            )
+        )
+
+    def update_rows(self, table: str, update_info: dict):
+        """
+        See SQLInterface.update_rows. Updates matched on (a superset of) the shard
+        fields go to the owning shard only; others are run on every shard.
+        Updates must not change shard field values.
+        """
+        key_fields = list(update_info["keys"])
+        shard_fields = self.shard_fields(table)
+        assert not set(shard_fields) & set(
+            update_info["update fields"]
+        ), f"Cannot update the shard fields of {table}: {shard_fields}"
+        if not shard_fields or not set(shard_fields).issubset(key_fields):
+            values = list(update_info["update values"])
+            return _total(
+                self._broadcast(
+                    lambda shard: shard.update_rows(
+                        table, {**update_info, "update values": values}
+                    )
+                )
+            )
+        positions = [key_fields.index(field) for field in shard_fields]
+        affinities = self._shard_affinities(table, shard_fields)
+        parts = [[] for _ in self.shards]
+        for keys, values in update_info["update values"]:
+            index = self.shard_index(table, [keys[i] for i in positions], affinities)
+            parts[index].append((keys, values))
+        return _total(
+            self._routed(
+                parts,
+                lambda shard, part: shard.update_rows(
+                    table, {**update_info, "update values": part}
+                ),
+            )
+        )
+
+    def delete_rows(self, table: str, fields: list, data, batch_size: int = None):
+        """
+        See SQLInterface.delete_rows. Rows matched on (a superset of) the shard
+        fields are deleted from the owning shard only; others from every shard.
+        """
+        shard_fields = self.shard_fields(table)
+        if shard_fields and set(shard_fields).issubset(fields):
+            parts = self._partition(table, fields, data)
+            results = self._routed(
+                parts,
+                lambda shard, part: shard.delete_rows(table, fields, part, batch_size),
+            )
+        else:
+            data = list(data)
+            results = self._broadcast(
+                lambda shard: shard.delete_rows(table, fields, data, batch_size)
+            )
+        return _total(results)
+
+    def flush(self):
+        self._broadcast(lambda shard: shard.flush())
+
+    # Reads
+
+    def retrieve_rows(self, query: str, params=(), merge=None, sort_key=None):
+        """
+        Run `query` on every shard in parallel and merge the results.
+
+        By default, the shards' rows are concatenated (in shard order). If each
+        shard's rows are sorted (eg, by ORDER BY), pass `sort_key` to merge them
+        in sorted order. For anything else (eg, aggregates), `merge` is called
+        with the list of per-shard results and its return value is returned.
+        """
+        results = self._broadcast(lambda shard: shard.retrieve_rows(query, params))
+        if merge is not None:
+            return merge(results)
+        if sort_key is not None:
+            return list(heapq.merge(*results, key=sort_key))
+        return [row for rows in results for row in rows]
+
+    def iter_rows(
+        self, query: str, params=(), batch_size: int = 1000, batches: bool = False
+    ):
+        """
+        Stream the results of `query` from each shard in turn (see
+        SQLInterface.iter_rows). Batches are fetched on the shards' threads.
+        """
+        exhausted = object()
+        for index, shard in enumerate(self.shards):
+            executor = self._executors[index]
+            rows = executor.submit(
+                shard.iter_rows, query, params, batch_size, True
+            ).result()
+            try:
+                while True:
+                    batch = executor.submit(next, rows, exhausted).result()
+                    if batch is exhausted:
+                        break
+                    if batches:
+                        yield batch
+                    else:
+                        yield from batch
+            finally:
+                executor.submit(rows.close).result()
+
+    def execute_pandas_query(self, command: str, merge=None):
+        """
+        DataFrame of `command` run on every shard (in parallel), concatenated,
+        or `merge(list of per-shard DataFrames)`
+        """
+        frames = self._broadcast(lambda shard: shard.execute_pandas_query(command))
+        if merge is not None:
+            return merge(frames)
+        return pd.concat(frames, ignore_index=True)
+
+    def fetch_dataframe(
+        self,
+        query: str,
+        params=(),
+        table: str = None,
+        batch_size: int = 10000,
+        merge=None,
+    ):
+        """
+        Typed DataFrame (see SQLInterface.fetch_columns) of `query` run on every
+        shard (in parallel), concatenated, or `merge(list of per-shard DataFrames)`
+        """
+        frames = self._broadcast(
+            lambda shard: shard.fetch_dataframe(query, params, table, batch_size)
+        )
+        if merge is not None:
+            return merge(frames)
+        return pd.concat(frames, ignore_index=True)
+
+    # Maintenance
+
+    def vacuum(self, shards: list = None):
+        """
+        Rebuild (VACUUM) the given shards [default: all], in parallel.
+        Other shards remain available for reads and writes meanwhile.
+        """
+        indexes = range(len(self.shards)) if shards is None else shards
+        vacuum = _statement("VACUUM;")
+        futures = [
+            self._run(
+                index,
+                lambda shard: shard._write(
+                    None, vacuum, kind="schema", deferrable=False
+                ),
+            )
+            for index in indexes
+        ]
+        for future in futures:
+            future.result()
+
+    def stats(self):
+        """Per-shard statistics snapshots (see SQLInterface.stats)"""
+        return self._broadcast(lambda shard: shard.stats())
@@ -8,14 +8,34 @@ or as accession IDs of information (ie, file paths in the configured '$MODULE/DB
 
 Implementation-specific details are left to the calling module. Default configuration is not provided.
 """
+import atexit
+import base64
+import contextlib
 import copy
+import csv
+import functools
+import hashlib
+import itertools
+import json
 import logging
+import math
 import os
+import queue
+import random
+import re
 import sqlite3
 import string
+import sys
+import threading
+import time
+import urllib.request
 
+import numpy as np
 import pandas as pd
 
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from collections.abc import MutableMapping
 from typing import NamedTuple
 
 from .string_utilities import string_to_camel_case
@@ -25,6 +45,7 @@ from .string_utilities import string_to_camel_case
 from .log_utilities import (
     create_silent_logger,
     create_logger,
+    lazy,
 )
 
 def _execute_command(cur, command: str):
@@ -37,15 +58,1131 @@ def _execute_command(cur, command: str):
         raise e
 
 
-def _retrieve_data(cur, command: str):
+def _retrieve_data(cur, command: str, params=()):
 
     try:
-        cur.execute(command)
+        cur.execute(command, params)
         return cur.fetchall()
     except Exception as e:
         raise
 
 
+# Compile-time default for SQLITE_MAX_VARIABLE_NUMBER prior to SQLite 3.32
+_DEFAULT_VARIABLE_LIMIT = 999
+
+# Default rows per multi-row statement: large statements cost more to prepare
+# than they save in round trips
+_ROWS_PER_STATEMENT = 256
+
+
+def _quote(identifier: str):
+    """Quote an SQLite identifier (table/field name), escaping embedded quotes"""
+    return '"{}"'.format(str(identifier).replace('"', '""'))
+
+
+def _variable_limit(conn):
+    """Maximum number of bound parameters allowed in a single statement"""
+    try:
+        return conn.getlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER)
+    except AttributeError:
+        # Connection.getlimit is only available from Python 3.11
+        return _DEFAULT_VARIABLE_LIMIT
+
+
+def _chunked(iterable, size: int):
+    """Yield lists of at most `size` items from any iterable (or generator)"""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _flatten(chunk: list, width: int):
+    params = []
+    for row in chunk:
+        assert (
+            len(row) == width
+        ), f"Mismatch in row length ({len(row)}) with field count ({width}). Aborting."
+        params.extend(row)
+    return params
+
+
+def _execute_chunked(cur, make_command, rows, width: int, batch_size: int = None):
+    """
+    Run a multi-row statement over `rows` using bound parameters.
+
+    `make_command(n)` must return the statement text for a chunk of `n` rows,
+    each contributing `width` parameters. Rows are consumed lazily in chunks of
+    `batch_size` rows [default `_ROWS_PER_STATEMENT`], capped by the connection's
+    variable limit; all full-sized chunks share a single prepared statement via
+    `executemany`, and any remainder is issued once with a statement sized to fit.
+    Returns the number of rows changed.
+    """
+    rows_per_statement = max(1, _variable_limit(cur.connection) // width)
+    rows_per_statement = max(
+        1, min(rows_per_statement, batch_size or _ROWS_PER_STATEMENT)
+    )
+    chunks = _chunked(rows, rows_per_statement)
+    first = next(chunks, None)
+    if first is None:
+        return 0
+    if len(first) < rows_per_statement:
+        # No full chunk: never prepare the full-sized statement
+        cur.execute(make_command(len(first)), _flatten(first, width))
+        return max(cur.rowcount, 0)
+    remainder = []
+
+    def full_chunks():
+        for chunk in itertools.chain([first], chunks):
+            if len(chunk) < rows_per_statement:
+                remainder.append(chunk)
+                return
+            yield _flatten(chunk, width)
+
+    cur.executemany(make_command(rows_per_statement), full_chunks())
+    changed = max(cur.rowcount, 0)
+    if remainder:
+        chunk = remainder[0]
+        cur.execute(make_command(len(chunk)), _flatten(chunk, width))
+        changed += max(cur.rowcount, 0)
+    return changed
+
+
+def _query_tables(query: str, tables):
+    """Names in `tables` referenced (quoted or bare) by `query`"""
+    referenced = []
+    for table in tables:
+        pattern = r'["`\[]{}["`\]]'.format(re.escape(table))
+        if table.isidentifier():
+            pattern += r"|\b{}\b".format(re.escape(table))
+        if re.search(pattern, query, flags=re.IGNORECASE):
+            referenced.append(table)
+    return referenced
+
+
+def _column_dtype(declared_type: str):
+    """NumPy dtype for a declared column type, following SQLite's affinity rules"""
+    declared_type = declared_type.upper()
+    if "INT" in declared_type:
+        return np.dtype(np.int64)
+    if any(t in declared_type for t in ("CHAR", "CLOB", "TEXT", "BLOB")):
+        return np.dtype(object)
+    if any(t in declared_type for t in ("REAL", "FLOA", "DOUB")):
+        return np.dtype(np.float64)
+    # NUMERIC affinity (or no declared type) may hold values of any storage class
+    return np.dtype(object)
+
+
+# Largest integer magnitude a float64 holds exactly
+_EXACT_FLOAT_INTEGER = 2 ** 53
+
+
+def _column_array(values, dtype=None):
+    """
+    Convert a sequence of column values to an array of `dtype` when every value
+    round-trips exactly: integer columns must hold only integers, and numeric
+    columns only numbers (NULLs widen to floats, as NaN). Columns holding other
+    storage classes (eg, REAL or TEXT values in an INTEGER column, which SQLite
+    allows) are returned as objects, unchanged.
+    Without a `dtype` (ie, no declared type), integers are tried first.
+    """
+    if dtype is None:
+        dtype = np.dtype(np.int64)
+    if dtype != object:
+        kinds = set(map(type, values))
+        if dtype == np.int64 and kinds <= {int}:
+            try:
+                return np.fromiter(values, dtype=dtype, count=len(values))
+            except OverflowError:
+                pass
+        elif kinds <= {int, float, type(None)} and all(
+            abs(v) <= _EXACT_FLOAT_INTEGER for v in values if type(v) is int
+        ):
+            return np.array(values, dtype=np.float64)
+    array = np.empty(len(values), dtype=object)
+    array[:] = values
+    return array
+
+
+def _coerce_series(series, dtype):
+    """
+    Values of a pandas Series as bindable Python objects (None for missing values),
+    converted once for the whole column to match a field's NumPy `dtype`
+    """
+    missing = series.isna()
+    if dtype == np.int64 or dtype == np.float64:
+        series = pd.to_numeric(series)
+        if dtype == np.int64:
+            whole = series[~missing]
+            if (whole == whole.round()).all():
+                series = series.astype("Int64")
+    elif dtype == object and series.dtype != object:
+        series = series.astype(object)
+    if missing.any():
+        series = series.astype(object).where(~missing, None)
+    return series.tolist()
+
+
+def _promote(dtype, other):
+    if dtype == other:
+        return dtype
+    if np.dtype(object) in (dtype, other):
+        return np.dtype(object)
+    return np.result_type(dtype, other)
+
+
+class _ColumnBuilder:
+
+    """Growable, pre-allocated typed array filled a batch at a time"""
+
+    def __init__(self, dtype, capacity: int):
+        self.dtype = dtype
+        self.capacity = capacity
+        self.array = None
+        self.length = 0
+
+    def extend(self, values):
+        batch = _column_array(values, self.dtype)
+        if self.array is None:
+            # Undeclared types are settled by the first batch
+            self.dtype = batch.dtype
+            self.array = np.empty(max(self.capacity, len(batch)), dtype=self.dtype)
+        dtype = _promote(self.array.dtype, batch.dtype)
+        if dtype != self.array.dtype:
+            self.dtype = dtype
+            self.array = self.array.astype(dtype)
+        end = self.length + len(batch)
+        if end > len(self.array):
+            self.array.resize(max(end, 2 * len(self.array)), refcheck=False)
+        self.array[self.length : end] = batch
+        self.length = end
+
+    def result(self):
+        if self.array is None:
+            return np.empty(0, dtype=self.dtype or object)
+        self.array.resize(self.length, refcheck=False)
+        return self.array
+
+
+_QUERY_TOKENS = re.compile(r"""'(?:[^']|'')*'|"(?:[^"]|"")*"|\s+|[^\s'"]+|['"]""")
+
+
+def _normalize_query(query: str):
+    """Collapse whitespace (outside of quoted literals) and drop trailing semicolons"""
+    tokens = [" " if t.isspace() else t for t in _QUERY_TOKENS.findall(query)]
+    return "".join(tokens).strip().rstrip(";").strip()
+
+
+def _result_rows(result):
+    """Number of rows in a query result (rows, DataFrame or dict of columns)"""
+    if isinstance(result, dict):
+        return len(next(iter(result.values()), ()))
+    return len(result)
+
+
+def _result_size(result):
+    """Approximate in-memory size (bytes) of a query result"""
+    if isinstance(result, pd.DataFrame):
+        return int(result.memory_usage(deep=True).sum())
+    size = sys.getsizeof(result)
+    for row in result:
+        size += sys.getsizeof(row) + sum(sys.getsizeof(value) for value in row)
+    return size
+
+
+class _QueryCache:
+
+    """
+    Thread-safe LRU cache of query results, bounded by entry count and size.
+
+    Entries are tagged with the tables their query reads; a write to a table
+    invalidates every entry tagged with it (entries with no known table are
+    invalidated by any write).
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int):
+        assert max_entries > 0, "Cache entry limit must be a positive integer"
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (result, size, tables)
+        self._by_table = {}  # table (or None) -> set of keys
+        self._lock = threading.Lock()
+        self.generation = 0
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, result, tables: list, generation: int):
+        size = _result_size(result)
+        if size > self.max_bytes:
+            return
+        tables = tables or [None]
+        with self._lock:
+            if generation != self.generation:
+                # A write landed while the query ran; the result may be stale
+                return
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (result, size, tables)
+            self.bytes += size
+            for table in tables:
+                self._by_table.setdefault(table, set()).add(key)
+            while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _remove(self, key):
+        _, size, tables = self._entries.pop(key)
+        self.bytes -= size
+        for table in tables:
+            keys = self._by_table.get(table)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_table[table]
+
+    def invalidate(self, table: str):
+        with self._lock:
+            self.generation += 1
+            keys = self._by_table.get(table, set()) | self._by_table.get(None, set())
+            for key in keys:
+                self._remove(key)
+            self.invalidations += len(keys)
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+            self._by_table.clear()
+            self.bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self.bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+class _TableMetadata(MutableMapping):
+
+    """
+    Lazily-populated mapping of table name to table information
+    (see SQLInterface.get_table_information).
+
+    Table names are listed on first use, and each table's fields are retrieved
+    on first access. Every access checks the database's `PRAGMA schema_version`,
+    discarding everything retained when it changes, so that schema changes are
+    picked up. Optionally, the metadata is persisted to (and loaded from) a JSON
+    file keyed by schema version and a fingerprint of the schema itself (as the
+    version is only a counter, which a recreated database can repeat), so an
+    unchanged schema needs no table queries at all.
+    """
+
+    def __init__(self, interface, cache_path: str = None):
+        self._interface = interface
+        self._cache_path = cache_path
+        self._lock = threading.RLock()
+        self._version = None
+        self._names = None
+        self._tables = {}
+        self._saved = False
+        if cache_path is not None:
+            self._load()
+
+    def _schema_version(self):
+        with self._interface._reading() as conn:
+            return conn.execute("PRAGMA schema_version;").fetchone()[0]
+
+    def _schema_state(self):
+        """Schema version and a hash of the schema's SQL, read together"""
+        with self._interface._reading() as conn:
+            version = conn.execute("PRAGMA schema_version;").fetchone()[0]
+            (schema,) = conn.execute(
+                "SELECT group_concat(sql, ';') FROM "
+                "(SELECT sql FROM sqlite_master ORDER BY type, name);"
+            ).fetchone()
+        return version, hashlib.sha256((schema or "").encode()).hexdigest()
+
+    def _sync(self):
+        version = self._schema_version()
+        if version != self._version:
+            if self._version is not None:
+                self._interface.logger.debug(
+                    "Schema version changed (%s -> %s), "
+                    "discarding table meta-information",
+                    self._version,
+                    version,
+                )
+            self._version = version
+            self._names = None
+            self._tables = {}
+            self._saved = False
+
+    def _table_names(self):
+        with self._lock:
+            self._sync()
+            if self._names is None:
+                self._names = self._interface.get_tables()
+            return self._names
+
+    def _load(self):
+        try:
+            with open(self._cache_path, "r") as fp:
+                cached = json.load(fp)
+        except (OSError, ValueError):
+            return
+        version, fingerprint = self._schema_state()
+        if (cached.get("schema_version"), cached.get("fingerprint")) != (
+            version,
+            fingerprint,
+        ):
+            self._interface.logger.debug(
+                "Stale metadata cache at %s, ignoring", self._cache_path
+            )
+            return
+        self._version = cached["schema_version"]
+        self._names = cached["tables"]
+        for table, info in cached["info"].items():
+            info["fields"] = {f: tuple(v) for f, v in info["fields"].items()}
+            self._tables[table] = info
+        self._saved = True
+
+    def save(self):
+        """Persist the retained metadata to the cache file (if configured)"""
+        if self._cache_path is None:
+            return
+        with self._lock:
+            if self._names is None or self._saved:
+                return
+            version, fingerprint = self._schema_state()
+            if version != self._version:
+                return  # Retained metadata is stale; it is re-read on next access
+            cached = {
+                "schema_version": version,
+                "fingerprint": fingerprint,
+                "tables": self._names,
+                "info": self._tables,
+            }
+            temporary_path = f"{self._cache_path}.tmp"
+            with open(temporary_path, "w") as fp:
+                json.dump(cached, fp)
+            os.replace(temporary_path, self._cache_path)
+            self._saved = True
+
+    def loaded(self):
+        """Names of tables whose information has already been retrieved"""
+        with self._lock:
+            return list(self._tables)
+
+    def __getitem__(self, table):
+        with self._lock:
+            if table not in self._table_names():
+                raise KeyError(table)
+            if table not in self._tables:
+                self._tables[table] = self._interface.retrieve_table_information(
+                    table
+                )
+                self._saved = False
+                if len(self._tables) == len(self._names):
+                    self.save()
+            return self._tables[table]
+
+    def __setitem__(self, table, info):
+        with self._lock:
+            names = self._table_names()
+            if table not in names:
+                names.append(table)
+            self._tables[table] = info
+            self._saved = False
+
+    def __delitem__(self, table):
+        with self._lock:
+            self._table_names().remove(table)
+            self._tables.pop(table, None)
+            self._saved = False
+
+    def __contains__(self, table):
+        return table in self._table_names()
+
+    def __iter__(self):
+        return iter(list(self._table_names()))
+
+    def __len__(self):
+        return len(self._table_names())
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
+class _WriteBuffer:
+
+    """
+    Write-behind queue for an SQLInterface.
+
+    Submitted writes are held in memory and applied by a background thread in a
+    single transaction once `max_rows` rows are pending, or every `interval`
+    seconds. Each submission is resolved through a Future once committed (or
+    failed); a failing submission is rolled back alone, via a savepoint.
+    """
+
+    def __init__(self, interface, interval: float, max_rows: int):
+        assert interval > 0, "Flush interval must be positive"
+        assert max_rows > 0, "Flush row count must be a positive integer"
+        self.interface = interface
+        self.interval = interval
+        self.max_rows = max_rows
+        self._condition = threading.Condition()
+        self._pending = []
+        self._pending_rows = 0
+        self._submitted = 0
+        self._completed = 0
+        self._flush_requested = False
+        self._errors = []
+        self._closed = False
+        self._thread = threading.Thread(
+            target=self._run, name="SQLInterfaceWriteBuffer", daemon=True
+        )
+        self._thread.start()
+
+    def submit(self, group: list, rows: int):
+        """
+        Queue a group of (table, operation, Future) writes, to be committed together
+        """
+        with self._condition:
+            assert not self._closed, "Write buffer has been shut down"
+            self._pending.append(group)
+            self._pending_rows += rows
+            self._submitted += 1
+            if self._pending_rows >= self.max_rows:
+                self._condition.notify_all()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(
+                    lambda: self._closed
+                    or self._flush_requested
+                    or self._pending_rows >= self.max_rows,
+                    timeout=self.interval,
+                )
+                groups = self._pending
+                self._pending, self._pending_rows = [], 0
+                self._flush_requested = False
+                closed = self._closed
+            if groups:
+                errors = self.interface._commit_groups(groups)
+            with self._condition:
+                if groups:
+                    self._errors.extend(errors)
+                    self._completed += len(groups)
+                    self._condition.notify_all()
+                if closed and not self._pending:
+                    return
+
+    def flush(self):
+        """Commit everything submitted so far; re-raises the first failure since the last flush"""
+        with self._condition:
+            target = self._submitted
+            self._flush_requested = True
+            self._condition.notify_all()
+            self._condition.wait_for(lambda: self._completed >= target)
+            errors, self._errors = self._errors, []
+        if errors:
+            raise errors[0]
+
+    def close(self):
+        """Stop accepting writes, and drain everything pending"""
+        with self._condition:
+            if self._closed:
+                return
+            self._closed = True
+            self._condition.notify_all()
+        self._thread.join()
+
+
+# Latency histogram resolution: buckets per doubling of latency (in microseconds)
+_BUCKETS_PER_OCTAVE = 4
+
+
+def _latency_bucket(seconds: float):
+    microseconds = seconds * 1e6
+    if microseconds <= 1:
+        return 0
+    return int(math.log2(microseconds) * _BUCKETS_PER_OCTAVE) + 1
+
+
+def _bucket_limit(bucket: int):
+    """Upper latency bound (seconds) of a histogram bucket"""
+    return 2 ** (bucket / _BUCKETS_PER_OCTAVE) / 1e6
+
+
+class _StatementStats:
+
+    __slots__ = ("calls", "rows", "total", "maximum", "histogram")
+
+    def __init__(self):
+        self.calls = 0
+        self.rows = 0
+        self.total = 0.0
+        self.maximum = 0.0
+        self.histogram = {}
+
+    def percentile(self, fraction: float):
+        target = fraction * self.calls
+        seen = 0
+        for bucket in sorted(self.histogram):
+            seen += self.histogram[bucket]
+            if seen >= target:
+                return min(_bucket_limit(bucket), self.maximum)
+        return self.maximum
+
+    def snapshot(self):
+        return {
+            "calls": self.calls,
+            "rows": self.rows,
+            "total s": self.total,
+            "mean s": self.total / self.calls if self.calls else 0.0,
+            "p50 s": self.percentile(0.50),
+            "p95 s": self.percentile(0.95),
+            "p99 s": self.percentile(0.99),
+            "max s": self.maximum,
+        }
+
+
+class _Persister:
+
+    """
+    Background persistence of an in-memory database to its file.
+
+    Every `interval` seconds, or once `max_changes` rows have changed, the
+    database is copied (under the write lock, at memory speed) to a snapshot,
+    which is then copied over the database file with the incremental backup API
+    (atomically, and without holding up the interface).
+    """
+
+    # Polling period for the change count, when persisting after N changes
+    _POLL_INTERVAL = 0.1
+
+    def __init__(
+        self, interface, interval: float = None, max_changes: int = None, pages: int = 256
+    ):
+        assert interval or max_changes, "Persistence needs an interval or a change count"
+        self.interface = interface
+        self.interval = interval
+        self.max_changes = max_changes
+        self.pages = pages
+        self.persisted_changes = interface.conn.total_changes
+        self.persisted_at = time.monotonic()
+        self._persist_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name="SQLInterfacePersister", daemon=True
+        )
+        self._thread.start()
+
+    def _pending_changes(self):
+        with self.interface._write_lock:
+            return self.interface.conn.total_changes - self.persisted_changes
+
+    def _run(self):
+        poll = self._POLL_INTERVAL if self.max_changes else self.interval
+        if self.interval:
+            poll = min(poll, self.interval)
+        while not self._stop.wait(poll):
+            changes = self._pending_changes()
+            if not changes:
+                continue
+            due = self.interval and time.monotonic() - self.persisted_at >= self.interval
+            if due or (self.max_changes and changes >= self.max_changes):
+                try:
+                    self.persist()
+                except Exception as e:
+                    self.interface.logger.error("Persisting the database failed: %s", e)
+
+    def snapshot(self):
+        """In-memory copy of the database, taken between writes"""
+        copy = sqlite3.connect(":memory:", check_same_thread=False)
+        with self.interface._write_lock:
+            changes = self.interface.conn.total_changes
+            self.interface.conn.backup(copy)
+        return copy, changes
+
+    def persist(self):
+        """Write the current database contents to the database file"""
+        with self._persist_lock:
+            db = self.interface.db
+            snapshot, changes = self.snapshot()
+            # The backup replaces the file's contents in a single transaction
+            destination = sqlite3.connect(db)
+            try:
+                snapshot.backup(destination, pages=self.pages)
+            finally:
+                destination.close()
+                snapshot.close()
+            self.persisted_changes = changes
+            self.persisted_at = time.monotonic()
+            self.interface.logger.debug("Persisted in-memory database to %s", db)
+
+    def close(self):
+        """Stop persisting in the background, after a final (synchronous) write"""
+        self._stop.set()
+        self._thread.join()
+        if self._pending_changes() or not os.path.isfile(self.interface.db):
+            self.persist()
+
+
+class _Instrumentation:
+
+    """
+    Per-statement-type and per-table counters for an SQLInterface: call counts,
+    a log-scale latency histogram (for percentiles) and rows read/written,
+    plus a log of slow statements with their query plans.
+    """
+
+    def __init__(self, interface, slow_threshold: float = None, slow_entries: int = 100):
+        self.interface = interface
+        self.slow_threshold = slow_threshold
+        self.slow_queries = deque(maxlen=slow_entries)
+        self._stats = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._emitter = None
+
+    def record(
+        self,
+        kind: str,
+        table: str,
+        seconds: float,
+        rows: int,
+        query: str = None,
+        params=(),
+    ):
+        bucket = _latency_bucket(seconds)
+        with self._lock:
+            stats = self._stats.get((kind, table))
+            if stats is None:
+                stats = self._stats[(kind, table)] = _StatementStats()
+            stats.calls += 1
+            stats.rows += rows
+            stats.total += seconds
+            stats.maximum = max(stats.maximum, seconds)
+            stats.histogram[bucket] = stats.histogram.get(bucket, 0) + 1
+        if self.slow_threshold is not None and seconds >= self.slow_threshold:
+            self._record_slow(kind, table, seconds, query, params)
+
+    def _record_slow(self, kind, table, seconds, query, params):
+        plan = None
+        if query is not None and re.match(
+            r"\s*(SELECT|WITH)\b", query, flags=re.IGNORECASE
+        ):
+            try:
+                with self.interface._reading() as conn:
+                    plan = [
+                        row[-1]
+                        for row in conn.execute(f"EXPLAIN QUERY PLAN {query}", params)
+                    ]
+            except sqlite3.Error as e:
+                plan = [f"(query plan unavailable: {e})"]
+        entry = {
+            "time": time.time(),
+            "kind": kind,
+            "table": table,
+            "seconds": seconds,
+            "query": query,
+            "plan": plan,
+        }
+        self.slow_queries.append(entry)
+        self.interface.logger.warning(
+            "Slow %s on %s (%.1f ms)%s%s",
+            kind,
+            table or "(unknown)",
+            seconds * 1000,
+            f"\n\t---> {query}" if query else "",
+            "".join(f"\n\t     {step}" for step in plan) if plan else "",
+        )
+
+    def stats(self):
+        with self._lock:
+            statements = {
+                f"{kind} {table}" if table else kind: stats.snapshot()
+                for (kind, table), stats in sorted(self._stats.items())
+            }
+        return {"statements": statements, "slow queries": list(self.slow_queries)}
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+        self.slow_queries.clear()
+
+    def start_emitting(self, interval: float):
+        """Log a statistics snapshot (at INFO) every `interval` seconds"""
+
+        def emit():
+            while not self._stop.wait(interval):
+                self.interface.logger.info(
+                    "SQLInterface statistics: %s", self.stats()["statements"]
+                )
+
+        self._emitter = threading.Thread(
+            target=emit, name="SQLInterfaceStatistics", daemon=True
+        )
+        self._emitter.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._emitter is not None:
+            self._emitter.join()
+
+
+_WHERE_CLAUSE = re.compile(
+    r"\bWHERE\b(.*?)(?:\bGROUP\s+BY\b|\bORDER\s+BY\b|\bLIMIT\b|$)",
+    flags=re.IGNORECASE | re.DOTALL,
+)
+_ORDER_CLAUSE = re.compile(
+    r"\b(?:ORDER|GROUP)\s+BY\b(.*?)(?:\bLIMIT\b|\bHAVING\b|$)",
+    flags=re.IGNORECASE | re.DOTALL,
+)
+
+
+def _field_pattern(field: str):
+    """Regex matching a (possibly quoted) reference to `field`"""
+    quoted = r'["`\[]{}["`\]]'.format(re.escape(field))
+    if field.isidentifier():
+        return r"(?:{}|\b{}\b)".format(quoted, re.escape(field))
+    return quoted
+
+
+def _scanned_table(detail: str, tables):
+    """Table fully scanned by a query plan step (eg, `SCAN bananas foster`), if any"""
+    match = re.match(r"SCAN (?:TABLE )?(.+)", detail)
+    if match is None or " USING " in detail:
+        return None
+    name = re.split(r" AS | USING ", match.group(1))[0].strip('"')
+    return name if name in tables else None
+
+
+class _IndexAdvisor:
+
+    """
+    Samples executed read queries, finds full table scans in their query plans
+    and proposes (covering, where practical) indexes for them.
+    """
+
+    def __init__(
+        self,
+        interface,
+        sample_rate: float,
+        min_rows: int = 1000,
+        max_queries: int = 1000,
+        max_columns: int = 6,
+    ):
+        self.interface = interface
+        self.sample_rate = sample_rate
+        self.min_rows = min_rows
+        self.max_columns = max_columns
+        self.queries = OrderedDict()  # normalized query -> [query, params, count]
+        self._max_queries = max_queries
+        self._lock = threading.Lock()
+
+    def observe(self, query: str, params=()):
+        if self.sample_rate < 1 and random.random() >= self.sample_rate:
+            return
+        normalized = _normalize_query(query)
+        if not re.match(r"(SELECT|WITH)\b", normalized, flags=re.IGNORECASE):
+            return
+        with self._lock:
+            entry = self.queries.get(normalized)
+            if entry is None:
+                entry = self.queries[normalized] = [query, params, 0]
+                if len(self.queries) > self._max_queries:
+                    self.queries.popitem(last=False)
+            self.queries.move_to_end(normalized)
+            entry[2] += 1
+
+    def _plan(self, query: str, params=()):
+        with self.interface._reading() as conn:
+            plan = conn.execute(f"EXPLAIN QUERY PLAN {query}", params).fetchall()
+        return [row[-1] for row in plan]
+
+    def _row_count(self, table: str, counts: dict):
+        if table not in counts:
+            command = "SELECT count(*) FROM {};".format(_quote(table))
+            with self.interface._reading() as conn:
+                counts[table] = conn.execute(command).fetchone()[0]
+        return counts[table]
+
+    def _index_columns(self, query: str, table: str):
+        fields = list(self.interface.meta_info["tables"][table]["fields"])
+        where = _WHERE_CLAUSE.search(query)
+        where = where.group(1) if where else ""
+        order = _ORDER_CLAUSE.search(query)
+        order = order.group(1) if order else ""
+        equality, ranges, ordering, referenced = [], [], [], []
+        for field in fields:
+            pattern = _field_pattern(field)
+            if re.search(pattern + r"\s*(?:==?|\bIN\b|\bIS\b)", where, re.IGNORECASE):
+                equality.append(field)
+            elif re.search(
+                pattern + r"\s*(?:[<>]=?|\bBETWEEN\b|\bLIKE\b|\bGLOB\b)",
+                where,
+                re.IGNORECASE,
+            ):
+                ranges.append(field)
+            if re.search(pattern, order):
+                ordering.append(field)
+            if re.search(pattern, query):
+                referenced.append(field)
+        # Equality terms first, then (at most) one range term, then sort order
+        columns = equality + ranges[:1]
+        columns += [f for f in ordering if f not in columns]
+        if not columns:
+            return None
+        covering = columns + [f for f in referenced if f not in columns]
+        select_all = re.match(r"\s*SELECT\s+(?:DISTINCT\s+)?\*", query, re.IGNORECASE)
+        if not select_all and len(covering) <= self.max_columns:
+            columns = covering
+        return columns
+
+    def suggest(self):
+        tables = self.interface.meta_info["tables"]
+        with self._lock:
+            sampled = list(self.queries.values())
+        suggestions, counts = {}, {}
+        for query, params, count in sampled:
+            try:
+                plan = self._plan(query, params)
+            except sqlite3.Error as e:
+                self.interface.logger.debug("Could not plan query %s: %s", query, e)
+                continue
+            for detail in plan:
+                table = _scanned_table(detail, tables)
+                if table is None or self._row_count(table, counts) < self.min_rows:
+                    continue
+                columns = self._index_columns(query, table)
+                if columns is None:
+                    continue
+                key = (table, tuple(columns))
+                if key not in suggestions:
+                    name = "advisor_{}_{}".format(table, "_".join(columns))
+                    name = re.sub(r"\W+", "_", name).lower()
+                    suggestions[key] = {
+                        "table": table,
+                        "columns": columns,
+                        "name": name,
+                        "sql": "CREATE INDEX IF NOT EXISTS {} ON {} ({});".format(
+                            _quote(name),
+                            _quote(table),
+                            ", ".join(_quote(c) for c in columns),
+                        ),
+                        "rows": counts[table],
+                        "queries": [],
+                        "plans": [],
+                        "executions": 0,
+                    }
+                suggestion = suggestions[key]
+                suggestion["queries"].append((query, params))
+                suggestion["plans"].append(plan)
+                suggestion["executions"] += count
+        return sorted(suggestions.values(), key=lambda s: -s["executions"])
+
+    def _measure(self, query: str, params, repeat: int):
+        timings = []
+        with self.interface._reading() as conn:
+            for _ in range(repeat):
+                start = time.perf_counter()
+                conn.execute(query, params).fetchall()
+                timings.append(time.perf_counter() - start)
+        return sorted(timings)[len(timings) // 2]
+
+    def apply(self, suggestions: list, remeasure: bool = True, repeat: int = 3):
+        report = []
+        for suggestion in suggestions:
+            before = (
+                [self._measure(q, p, repeat) for q, p in suggestion["queries"]]
+                if remeasure
+                else None
+            )
+            created = self.interface._write(
+                suggestion["table"], _statement(suggestion["sql"]), kind="index"
+            )
+            if isinstance(created, Future):
+                created.result()
+            self.interface.logger.info("Created index: %s", suggestion["sql"])
+            entry = {"index": suggestion["name"], "sql": suggestion["sql"]}
+            if remeasure:
+                entry["queries"] = [
+                    {
+                        "query": q,
+                        "before s": b,
+                        "after s": self._measure(q, p, repeat),
+                        "plan": self._plan(q, p),
+                    }
+                    for (q, p), b in zip(suggestion["queries"], before)
+                ]
+            report.append(entry)
+        return report
+
+
+# Pragmas applied to every connection in pooled mode, unless overridden
+# by the 'pragmas' configuration entry
+_POOLED_PRAGMAS = {"journal_mode": "WAL", "busy_timeout": 5000}
+
+
+def _apply_pragmas(conn, pragmas: dict):
+    for name, value in pragmas.items():
+        assert str(name).replace("_", "").isalnum(), f"Invalid pragma name {name}"
+        conn.execute(f"PRAGMA {name} = {value};")
+
+
+def _connect(db: str, pragmas: dict = None, **kwargs):
+    conn = sqlite3.connect(db, **kwargs)
+    if pragmas:
+        _apply_pragmas(conn, pragmas)
+    return conn
+
+
+def _scan_partition(db: str, query: str, params=()):
+    """Rows of `query` on a read-only connection (run in a worker process)"""
+    uri = "file:{}?mode=ro".format(urllib.request.pathname2url(db))
+    conn = sqlite3.connect(uri, uri=True)
+    try:
+        return conn.execute(query, params).fetchall()
+    finally:
+        conn.close()
+
+
+class _ConnectionPool:
+
+    """
+    Bounded pool of reader connections to a single database file.
+
+    Connections are opened lazily (up to `size`) and checked out by one
+    thread at a time; callers block while all connections are in use.
+    """
+
+    def __init__(self, db: str, size: int, pragmas: dict = None):
+        assert size > 0, "Connection pool size must be a positive integer"
+        self.db = db
+        self.size = size
+        self.pragmas = pragmas or {}
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._connections = []
+        self._lock = threading.Lock()
+
+    def _open(self):
+        conn = _connect(self.db, self.pragmas, check_same_thread=False)
+        with self._lock:
+            self._connections.append(conn)
+        return conn
+
+    @contextlib.contextmanager
+    def connection(self):
+        self._slots.acquire()
+        try:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                conn = self._open()
+            try:
+                yield conn
+            finally:
+                if conn.in_transaction:
+                    conn.rollback()
+                self._idle.put(conn)
+        finally:
+            self._slots.release()
+
+    def close(self):
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+        self._idle = queue.LifoQueue()
+
+
+# Change-data capture tables
+_CHANGE_LOG = "change log"
+_CHANGE_CONSUMERS = "change consumers"
+
+
+def _change_triggers(table: str, keys: list):
+    """Statements (re)creating the change-capture triggers of `table`"""
+    name = "'{}'".format(table.replace("'", "''"))
+    new = "json_array({})".format(", ".join(f"NEW.{_quote(k)}" for k in keys))
+    old = "json_array({})".format(", ".join(f"OLD.{_quote(k)}" for k in keys))
+    moved = " OR ".join(f"OLD.{_quote(k)} IS NOT NEW.{_quote(k)}" for k in keys)
+    log = "INSERT INTO {} (\"table\", op, keys)".format(_quote(_CHANGE_LOG))
+    bodies = {
+        "INSERT": f"{log} VALUES ({name}, 'insert', {new});",
+        "UPDATE": (
+            f"{log} SELECT {name}, 'delete', {old} WHERE {moved}; "
+            f"{log} VALUES ({name}, 'update', {new});"
+        ),
+        "DELETE": f"{log} VALUES ({name}, 'delete', {old});",
+    }
+    statements = []
+    for event, body in bodies.items():
+        trigger = _quote(f"change capture {table} {event.lower()}")
+        statements.append(f"DROP TRIGGER IF EXISTS {trigger};")
+        statements.append(
+            f"CREATE TRIGGER {trigger} AFTER {event} ON {_quote(table)} "
+            f"BEGIN {body} END;"
+        )
+    return statements
+
+
+def _statement(command: str):
+    """Write operation running a single (parameterless) statement, eg DDL"""
+
+    def execute(cur):
+        cur.execute(command)
+        return max(cur.rowcount, 0)
+
+    return execute
+
+
+def _statements(commands: list):
+    """Write operation running several (parameterless) statements, eg DDL"""
+
+    def execute(cur):
+        for command in commands:
+            cur.execute(command)
+        return 0
+
+    return execute
+
+
+def _json_value(value):
+    """JSON representation of values `json` cannot encode (ie, BLOBs)"""
+    if isinstance(value, (bytes, memoryview)):
+        return base64.b64encode(value).decode("ascii")
+    raise TypeError(f"Cannot export value of type {type(value)}")
+
+
+def _count(data):
+    return len(data) if hasattr(data, "__len__") else 1
+
+
 def validate_config(config: dict):
     try:
         assert {"project dir", "db config", "db file"}.issubset(
@@ -71,6 +1208,45 @@ class SQLInterface:
                 that contains linked information.
             'db config': SQL script defining the database
             'db file': Database file (SQLite-only!) at `path`, optionally already created
+        Optionally:
+            'pool size': Number of pooled reader connections. When set, the interface
+                may be shared between threads: reads check out their own connection
+                and writes are serialized on a single writer connection.
+                The database is switched to WAL journaling, so readers do not block
+                (and are not blocked by) the writer.
+            'pragmas': Mapping of PRAGMA name to value, applied to every connection
+            'cache entries': Maximum number of cached query results. When set,
+                `retrieve_rows` and `execute_pandas_query` results are cached until
+                a write touches one of the tables the query reads.
+            'cache bytes': Maximum (approximate) size of the query cache [default 64 MiB]
+            'metadata cache': Persist table meta-information between runs, keyed by
+                the schema version. Either `True` (stored next to the database file)
+                or a file path, relative to 'project dir'.
+            'write buffer': If `True`, writes are queued in memory and committed in
+                groups by a background thread. Write methods then return a Future
+                (resolved with the usual return value once committed);
+                see `flush` and `transaction`.
+            'flush interval ms': Longest time a buffered write waits [default 50]
+            'flush rows': Number of pending rows that triggers a flush [default 1000]
+            'instrumentation': If `True`, record per-statement-type and per-table call
+                counts, latency percentiles and row counts; see `stats`
+            'slow query ms': Log statements slower than this (with their query plans);
+                implies 'instrumentation'
+            'stats interval s': Periodically log a statistics snapshot (at INFO)
+            'index advisor': Fraction of read queries to sample for index suggestions
+                (`True` for all); see `suggest_indexes`
+            'index advisor rows': Smallest table considered for indexing [default 1000]
+            'blob dir': Directory of the blob store, relative to 'project dir'
+                [default 'DB']; see `blobs`
+            'in memory': If `True`, the database is held in memory: loaded from
+                'db file' (or created from 'db config') at start-up and written back
+                to 'db file' in the background, and on `close`. Not compatible
+                with 'pool size'.
+            'persist interval s': Longest time between writes to disk of an
+                in-memory database [default 5, unless 'persist changes' is set]
+            'persist changes': Number of changed rows that triggers a write to disk
+            'change capture': Record changes to tables in a change log; `True` for
+                every table, or a list of tables. See `enable_change_capture`
         """
 
         assert (
@@ -97,14 +1273,36 @@ class SQLInterface:
         base_path = os.path.abspath(os.path.expanduser(config["project dir"]))
         self.db_path = base_path
         self.db = os.path.join(base_path, db_name)
-        self.logger.debug(f"Attempting to connect to database at path {self.db}")
+        self.logger.debug("Attempting to connect to database at path %s", self.db)
         db_exists = True
         if not os.path.isfile(self.db):
-            self.logger.info(f" --- Did not find a database file at {self.db}")
+            self.logger.info(" --- Did not find a database file at %s", self.db)
             self.logger.info(" --- Attempting to create the database")
             db_exists = False
-        self.conn = sqlite3.connect(self.db)
+        pool_size = config.get("pool size")
+        in_memory = config.get("in memory", False)
+        assert not (
+            in_memory and pool_size
+        ), "Pooled connections cannot share an in-memory database"
+        pragmas = dict(config.get("pragmas", {}))
+        if pool_size:
+            pragmas = {**_POOLED_PRAGMAS, **pragmas}
+        buffered = config.get("write buffer", False)
+        self._write_lock = threading.RLock()
+        self._local = threading.local()
+        self.conn = _connect(
+            ":memory:" if in_memory else self.db,
+            pragmas,
+            check_same_thread=not (pool_size or buffered or in_memory),
+        )
         self.cur = self.conn.cursor()
+        if in_memory and db_exists:
+            self.logger.debug("Loading %s into memory", self.db)
+            source = sqlite3.connect(self.db)
+            try:
+                source.backup(self.conn)
+            finally:
+                source.close()
         if not db_exists:
             try:
                 config_path = os.path.join(base_path, config["db config"])
@@ -114,34 +1312,419 @@ class SQLInterface:
                 db_config.close()
             except:
                 raise
-        self.meta_info = {"tables": {}}
-        self.retrieve_metadata()
+        self.pool = _ConnectionPool(self.db, pool_size, pragmas) if pool_size else None
+        self.persister = None
+        if in_memory:
+            persist_changes = config.get("persist changes")
+            self.persister = _Persister(
+                self,
+                config.get("persist interval s", None if persist_changes else 5),
+                persist_changes,
+            )
+            atexit.register(self.persister.close)
+        cache_entries = config.get("cache entries")
+        self.cache = (
+            _QueryCache(cache_entries, config.get("cache bytes", 64 * 2 ** 20))
+            if cache_entries
+            else None
+        )
+        metadata_cache = config.get("metadata cache")
+        if metadata_cache is True:
+            metadata_cache = f"{self.db}.meta.json"
+        elif metadata_cache:
+            metadata_cache = os.path.join(base_path, metadata_cache)
+        # Table information is retrieved lazily, as tables are used
+        self.meta_info = {"tables": _TableMetadata(self, metadata_cache or None)}
+        self.instruments = None
+        slow_query_ms = config.get("slow query ms")
+        if config.get("instrumentation") or slow_query_ms is not None:
+            self.instruments = _Instrumentation(
+                self, slow_query_ms / 1000 if slow_query_ms is not None else None
+            )
+            if config.get("stats interval s"):
+                self.instruments.start_emitting(config["stats interval s"])
+        advisor_rate = config.get("index advisor")
+        self.advisor = None
+        if advisor_rate:
+            self.advisor = _IndexAdvisor(
+                self,
+                1.0 if advisor_rate is True else advisor_rate,
+                config.get("index advisor rows", 1000),
+            )
+        self.buffer = None
+        if buffered:
+            self.buffer = _WriteBuffer(
+                self,
+                config.get("flush interval ms", 50) / 1000,
+                config.get("flush rows", 1000),
+            )
+            atexit.register(self.buffer.close)
+        self._blobs = None
+        self._captured = None  # Tables with change-capture triggers, once read
+        capture = config.get("change capture")
+        if capture:
+            self.enable_change_capture(None if capture is True else capture)
+
+    @property
+    def blobs(self):
+        """
+        Content-addressed store for large payloads, kept in the 'blob dir' directory
+        and recorded (by accession ID) in the 'blob accessions' table
+        """
+        if self._blobs is None:
+            from .blob_store import BlobStore
+
+            self._blobs = BlobStore(
+                os.path.join(self.db_path, self.config.get("blob dir", "DB")), self
+            )
+        return self._blobs
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        if self.buffer is not None:
+            self.buffer.close()
+            atexit.unregister(self.buffer.close)
+        if self.persister is not None:
+            self.persister.close()
+            atexit.unregister(self.persister.close)
+        if self.instruments is not None:
+            self.instruments.stop()
+        with self._write_lock:
+            self.meta_info["tables"].save()
+            if self.pool is not None:
+                self.pool.close()
+            self.conn.close()
+
+    @contextlib.contextmanager
+    def _reading(self):
+        """Connection for read-only work: pooled if configured, else the shared one"""
+        if self.pool is None:
+            # The shared connection may also be in use by the write buffer
+            with self._write_lock:
+                yield self.conn
+        else:
+            with self.pool.connection() as conn:
+                yield conn
+
+    @contextlib.contextmanager
+    def _streaming(self):
+        """
+        Connection for streaming reads, with a lock to hold around each use of it:
+        pooled if configured (held until streaming finishes), else the shared one,
+        locked per batch only, so writes (and flushes) can run between batches
+        """
+        if self.pool is None:
+            yield self.conn, self._write_lock
+        else:
+            with self.pool.connection() as conn:
+                yield conn, contextlib.nullcontext()
+
+    def _fetch_batches(self, query: str, params, batch_size: int, names: list = None):
+        """
+        Batches of up to `batch_size` rows of `query`, fetched on a cursor of their
+        own. If given, `names` is extended with the result's column names.
+        """
+        with self._streaming() as (conn, lock):
+            with lock:
+                cur = conn.cursor()
+            try:
+                with lock:
+                    cur.execute(query, params)
+                if names is not None:
+                    names.extend(d[0] for d in cur.description)
+                while True:
+                    with lock:
+                        rows = cur.fetchmany(batch_size)
+                    if not rows:
+                        return
+                    yield rows
+            finally:
+                with lock:
+                    cur.close()
+
+    def _snapshot(self, data):
+        """Materialize `data` if the write it belongs to will be applied later"""
+        if self.buffer is not None and not isinstance(data, list):
+            return list(data)
+        return data
+
+    def _instrumented(self, kind: str, table: str, operation):
+        """Wrap a write operation so that its latency and row count are recorded"""
+
+        def timed(cur):
+            start = time.perf_counter()
+            result = operation(cur)
+            self.instruments.record(kind, table, time.perf_counter() - start, result)
+            return result
+
+        return timed
+
+    def _timed_read(self, kind: str, query: str, params, read):
+        """Wrap `read()` so that its latency and row count are recorded"""
+        if self.instruments is None:
+            return read
+
+        def timed():
+            start = time.perf_counter()
+            result = read()
+            tables = _query_tables(query, self.meta_info["tables"])
+            self.instruments.record(
+                kind,
+                ", ".join(tables),
+                time.perf_counter() - start,
+                _result_rows(result),
+                query,
+                params,
+            )
+            return result
+
+        return timed
+
+    def _timed_stream(self, kind: str, query: str, params, batches):
+        """Record the time spent fetching a stream of row batches (not consuming it)"""
+        if self.instruments is None:
+            yield from batches
+            return
+        elapsed, rows = 0.0, 0
+        try:
+            while True:
+                start = time.perf_counter()
+                batch = next(batches, None)
+                elapsed += time.perf_counter() - start
+                if batch is None:
+                    return
+                rows += len(batch)
+                yield batch
+        finally:
+            tables = _query_tables(query, self.meta_info["tables"])
+            self.instruments.record(
+                kind, ", ".join(tables), elapsed, rows, query, params
+            )
+
+    def stats(self):
+        """
+        Snapshot of recorded statement statistics (requires 'instrumentation'):
+            'statements': {"<kind> <table>": calls, rows, latency mean/percentiles}
+            'slow queries': Recent statements over the 'slow query ms' threshold
+        """
+        assert self.instruments is not None, "Instrumentation is not enabled"
+        return self.instruments.stats()
+
+    def _write(
+        self,
+        table: str,
+        operation,
+        rows: int = 1,
+        kind: str = "write",
+        deferrable: bool = True,
+    ):
+        """
+        Run `operation(cursor)` on the writer connection and commit the result,
+        rolling back on failure. Writers are serialized.
+
+        In write-buffer mode the operation is queued instead, and a Future
+        for its result is returned (unless not `deferrable`, in which case the
+        buffer is flushed and the operation run directly). Inside `transaction()`,
+        the commit (or queueing) is deferred to the end of the transaction.
+        """
+        if self.instruments is not None:
+            operation = self._instrumented(kind, table, operation)
+        buffered = self.buffer is not None and deferrable
+        pending = getattr(self._local, "transaction", None)
+        if pending is not None:
+            if self.buffer is not None:
+                assert deferrable, f"Cannot run {kind} in a buffered transaction"
+                future = Future()
+                pending.append((table, operation, future))
+                self._local.transaction_rows += rows
+                return future
+            pending.append(table)
+            return operation(self.cur)
+        if buffered:
+            future = Future()
+            self.buffer.submit([(table, operation, future)], rows)
+            return future
+        if self.buffer is not None:
+            self.buffer.flush()
+        with self._write_lock:
+            try:
+                result = operation(self.cur)
+            except Exception:
+                self.conn.rollback()
+                raise
+            self.conn.commit()
+            self._invalidate([table])
+        return result
+
+    def _captured_tables(self):
+        """Tables whose changes are captured (by triggers) in the change log"""
+        if self._captured is None:
+            command = (
+                "SELECT DISTINCT tbl_name FROM sqlite_master "
+                "WHERE type = 'trigger' AND name LIKE 'change capture %';"
+            )
+            with self._reading() as conn:
+                self._captured = {table for (table,) in conn.execute(command)}
+        return self._captured
+
+    def _invalidate(self, tables):
+        """
+        Discard cached results of `tables`, and of the change log if their
+        changes are captured (as the capture triggers write to it)
+        """
+        if self.cache is None:
+            return
+        tables = set(tables)
+        if tables & self._captured_tables():
+            tables.add(_CHANGE_LOG)
+        for table in tables:
+            self.cache.invalidate(table)
+
+    def _commit_groups(self, groups: list):
+        """
+        Apply queued write groups in one transaction (write buffer thread).
+        Each group is isolated in a savepoint, so a failure only discards that group.
+        Returns the exceptions raised.
+        """
+        errors, committed = [], []
+        with self._write_lock:
+            try:
+                if not self.conn.in_transaction:
+                    self.cur.execute("BEGIN;")
+                for group in groups:
+                    self.cur.execute("SAVEPOINT buffered_write;")
+                    try:
+                        results = [op(self.cur) for _, op, _ in group]
+                    except Exception as e:
+                        self.cur.execute("ROLLBACK TO buffered_write;")
+                        self.cur.execute("RELEASE buffered_write;")
+                        self.logger.error("Buffered write failed: %s", e)
+                        errors.append(e)
+                        for _, _, future in group:
+                            future.set_exception(e)
+                        continue
+                    self.cur.execute("RELEASE buffered_write;")
+                    committed.append((group, results))
+                self.conn.commit()
+            except Exception as e:
+                self.conn.rollback()
+                self.logger.error("Buffered commit failed: %s", e)
+                errors.append(e)
+                for group, _ in committed:
+                    for _, _, future in group:
+                        future.set_exception(e)
+                return errors
+            self._invalidate(t for group, _ in committed for t, _, _ in group)
+        for group, results in committed:
+            for (_, _, future), result in zip(group, results):
+                future.set_result(result)
+        return errors
+
+    def flush(self):
+        """
+        Write-buffer mode: block until every write submitted so far is committed.
+        Raises the first error from a buffered write since the previous flush.
+        """
+        if self.buffer is not None:
+            self.buffer.flush()
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """
+        Group the writes made (by this thread) within the block into a single,
+        atomic transaction: committed when the block exits, or discarded if it raises.
+        In write-buffer mode the group is queued as a unit on exit.
+        """
+        assert (
+            getattr(self._local, "transaction", None) is None
+        ), "Transactions cannot be nested"
+        pending = self._local.transaction = []
+        self._local.transaction_rows = 0
+        if self.buffer is not None:
+            try:
+                yield self
+            finally:
+                self._local.transaction = None
+            if pending:
+                self.buffer.submit(pending, self._local.transaction_rows)
+            return
+        with self._write_lock:
+            try:
+                yield self
+            except BaseException:
+                self.conn.rollback()
+                raise
+            else:
+                self.conn.commit()
+            finally:
+                self._local.transaction = None
+            self._invalidate(pending)
+
+    def _cached_read(self, kind: str, query: str, params, read):
+        """
+        Serve `read()` through the query cache (when enabled, for SELECTs only).
+        Inside `transaction()` the cache is bypassed, as the block's writes only
+        invalidate cached results once committed.
+        """
+        if self.cache is None or getattr(self._local, "transaction", None) is not None:
+            return read()
+        normalized = _normalize_query(query)
+        if not re.match(r"(SELECT|WITH)\b", normalized, flags=re.IGNORECASE):
+            return read()
+        if isinstance(params, dict):
+            params = sorted(params.items())
+        key = (kind, normalized, tuple(params))
+        result = self.cache.get(key)
+        if result is None:
+            generation = self.cache.generation
+            result = read()
+            self.cache.put(
+                key,
+                result,
+                _query_tables(normalized, self.meta_info["tables"]),
+                generation,
+            )
+        return result.copy()
+
+    def cache_stats(self):
+        """Hit/miss/eviction counters and current size of the query cache"""
+        assert self.cache is not None, "Query cache is not enabled ('cache entries')"
+        return self.cache.stats()
 
     def get_tables(self):
         table_command = "SELECT name FROM sqlite_master WHERE type='table';"
-        tables = _retrieve_data(self.cur, table_command)
-        self.logger.debug([table_name[0] for table_name in tables])
-        return [table_name[0] for table_name in tables]
+        with self._reading() as conn:
+            tables = _retrieve_data(conn.cursor(), table_command)
+        names = [table_name[0] for table_name in tables]
+        self.logger.debug("Tables: %s", names)
+        return names
 
     def retrieve_metadata(self):
-        tables = self.get_tables()
-        self.logger.debug(f"Retrieved table data: {tables}")
-        field_command = 'PRAGMA table_info("{}");'
+        """Eagerly retrieve information for every table (normally done lazily)"""
+        tables = list(self.meta_info["tables"])
+        self.logger.debug("Retrieved table data: %s", tables)
         for table in tables:
-            fields = _retrieve_data(self.cur, field_command.format(table))
-            self.logger.debug(f"Retrieved field info {fields}")
-            if table in self.meta_info["tables"]:
-                self.logger.debug(
-                    f"Found already-defined table {table}. Skipping re-definition"
-                )
-                continue
-            self.meta_info["tables"][table] = self.get_table_information(table, fields)
+            self.meta_info["tables"][table]
         self.logger.debug(
-            f"Retained table meta-information:\n{self.meta_info['tables']}"
+            "Retained table meta-information:\n%s", self.meta_info["tables"]
         )
 
+    def retrieve_table_information(self, table: str):
+        field_command = "PRAGMA table_info({});".format(_quote(table))
+        with self._reading() as conn:
+            fields = _retrieve_data(conn.cursor(), field_command)
+        self.logger.debug("Retrieved field info %s", fields)
+        return self.get_table_information(table, fields)
+
     def get_table_information(self, table, fields):
-        self.logger.debug(f"Table conversion: Got table {table} and fields {fields}")
+        self.logger.debug(
+            "Table conversion: Got table %s and fields %s", table, fields
+        )
         keys, required = [], []
         field_names = {}
         for f in fields:
@@ -183,100 +1766,792 @@ class SQLInterface:
             )
             return (db_keys, fields)
 
-    def insert_rows(self, table: str, fields: list, data: list):
+    def insert_rows(self, table: str, fields: list, data, batch_size: int = None):
+        """
+        Insert (or replace) rows of `data` into `table`.
 
-        assert isinstance(
-            data, list
-        ), "Data must be provided as a list (even singleton entries!)"
+        `data` may be any iterable of tuples (including a generator); rows are
+        consumed in chunks and written with bound parameters, so neither the full
+        data set nor the SQL text for it need to be held in memory.
+        All chunks are written in a single transaction.
+        Returns the number of rows written.
+        """
 
-        self.logger.debug(f"Found fields for insertion: {fields}")
-        self.logger.debug(f"Received data:\n{data}")
-        fields = [f'"{field}"' for field in fields]
-        insert_command = 'INSERT OR REPLACE INTO "{}" ({})'.format(
-            table,
-            ", ".join(fields),
+        assert not isinstance(
+            data, (str, bytes, dict)
+        ), "Data must be provided as an iterable of tuples (even singleton entries!)"
+        data = self._snapshot(data)
+
+        self.logger.debug("Found fields for insertion: %s", fields)
+        width = len(fields)
+        row_values = "({})".format(", ".join("?" * width))
+        insert_command = 'INSERT OR REPLACE INTO {} ({}) VALUES '.format(
+            _quote(table),
+            ", ".join(_quote(field) for field in fields),
         )
-        insert_command += " VALUES {};".format(
-            ",".join(f"{tup}" if len(tup) > 1 else f"({tup[0]})" for tup in data)
+        self.logger.debug(
+            "Issuing insertion command\n\t ---> %s%s", insert_command, row_values
         )
-        self.logger.debug(f"Issuing insertion command")
-        self.logger.debug(insert_command)
         try:
-            _execute_command(self.cur, insert_command)
+            return self._write(
+                table,
+                lambda cur: _execute_chunked(
+                    cur,
+                    lambda n: insert_command + ", ".join([row_values] * n) + ";",
+                    data,
+                    width,
+                    batch_size,
+                ),
+                _count(data),
+                "insert",
+            )
         except Exception as e:
             print(f" --- Exception {e} ---\nLast command:\n\t{insert_command}")
             raise
-        self.conn.commit()
+
+    def upsert_rows(self, table: str, fields: list, data, batch_size: int = None):
+        """
+        Insert rows of `data` into `table`, updating rows whose primary key
+        already exists in place (`ON CONFLICT (keys) DO UPDATE`).
+
+        Unlike `insert_rows` (INSERT OR REPLACE, ie delete-then-insert), only the
+        supplied `fields` are changed on conflict: rowids are kept, and columns
+        not supplied keep their values. `fields` must include the table's keys.
+        Rows are written in bound-parameter batches, in a single transaction.
+        Returns the number of rows inserted or updated.
+        """
+
+        assert not isinstance(
+            data, (str, bytes, dict)
+        ), "Data must be provided as an iterable of tuples (even singleton entries!)"
+        keys = self.meta_info["tables"][table]["keys"]
+        if not keys:
+            raise ValueError(f"Table {table} has no primary key to upsert on")
+        assert set(keys).issubset(
+            fields
+        ), f"Fields for upsert must include the keys of {table}: {keys}"
+        data = self._snapshot(data)
+
+        width = len(fields)
+        row_values = "({})".format(", ".join("?" * width))
+        updates = [field for field in fields if field not in keys]
+        if updates:
+            conflict = "DO UPDATE SET {}".format(
+                ", ".join(f"{_quote(f)} = excluded.{_quote(f)}" for f in updates)
+            )
+        else:
+            conflict = "DO NOTHING"
+        upsert_command = "INSERT INTO {} ({}) VALUES ".format(
+            _quote(table),
+            ", ".join(_quote(field) for field in fields),
+        )
+        conflict_clause = " ON CONFLICT ({}) {};".format(
+            ", ".join(_quote(key) for key in keys), conflict
+        )
+        self.logger.debug(
+            "Issuing upsert command\n\t ---> %s%s%s",
+            upsert_command,
+            row_values,
+            conflict_clause,
+        )
+        return self._write(
+            table,
+            lambda cur: _execute_chunked(
+                cur,
+                lambda n: upsert_command + ", ".join([row_values] * n) + conflict_clause,
+                data,
+                width,
+                batch_size,
+            ),
+            _count(data),
+            "upsert",
+        )
+
+    def _import_columns(self, table: str, columns: list, column_map: dict = None):
+        """Table field (or None, if skipped) for each of the input `columns`"""
+        table_fields = self.meta_info["tables"][table]["fields"]
+        column_map = column_map or {}
+        fields = []
+        for column in columns:
+            field = column_map.get(column, column)
+            if field is not None and field not in table_fields:
+                if column in column_map:
+                    raise ValueError(f"Field {field} not found in table {table}")
+                self.logger.warning(
+                    "Skipping column %s: no such field in %s", column, table
+                )
+                field = None
+            fields.append(field)
+        assert any(fields), f"No columns to import into table {table}"
+        return fields
+
+    def _secondary_indexes(self, table: str):
+        """
+        (name, SQL) of the explicitly created, non-unique indexes on `table`
+        (unique indexes enforce constraints, so are never dropped for a load)
+        """
+        command = (
+            "SELECT m.name, m.sql FROM sqlite_master AS m "
+            "JOIN pragma_index_list(?) AS i ON i.name = m.name "
+            "WHERE m.type = 'index' AND m.sql IS NOT NULL AND NOT i.\"unique\";"
+        )
+        with self._reading() as conn:
+            return _retrieve_data(conn.cursor(), command, (table,))
+
+    def import_dataframe(
+        self,
+        table: str,
+        frames,
+        column_map: dict = None,
+        batch_size: int = None,
+        commit_rows: int = None,
+        rebuild_indexes: bool = False,
+    ):
+        """
+        Insert (or replace) the rows of a DataFrame, or of an iterable of
+        DataFrames (eg, a chunked reader), into `table`.
+
+        Columns are matched to table fields by name, or through `column_map`
+        (column -> field, or None to skip a column); unmatched columns are skipped.
+        Each column is coerced once per frame to its field's declared type, and
+        rows are written with bound-parameter batches, in a single transaction
+        (or one per `commit_rows` rows). Frames are consumed one at a time, so
+        memory use is bounded by the frame size.
+        If `rebuild_indexes` is set, the table's non-unique secondary indexes are
+        dropped for the load and recreated afterwards, all in one transaction
+        (so `commit_rows` is ignored, and a failed load keeps the indexes).
+        Returns the number of rows written.
+        """
+        if isinstance(frames, pd.DataFrame):
+            frames = [frames]
+        frames = iter(frames)
+        first = next(frames, None)
+        if first is None:
+            return 0
+        columns = list(first.columns)
+        fields = self._import_columns(table, columns, column_map)
+        selected = [(c, f) for c, f in zip(columns, fields) if f is not None]
+        table_fields = self.meta_info["tables"][table]["fields"]
+        types = [_column_dtype(table_fields[f][1]) for _, f in selected]
+        width = len(selected)
+        row_values = "({})".format(", ".join("?" * width))
+        insert_command = "INSERT OR REPLACE INTO {} ({}) VALUES ".format(
+            _quote(table),
+            ", ".join(_quote(f) for _, f in selected),
+        )
+        make_command = lambda n: insert_command + ", ".join([row_values] * n) + ";"
+
+        indexes = self._secondary_indexes(table) if rebuild_indexes else []
+        if indexes:
+            commit_rows = None
+
+        def load(cur):
+            if indexes and not cur.connection.in_transaction:
+                cur.execute("BEGIN;")
+            for name, _ in indexes:
+                cur.execute(f"DROP INDEX {_quote(name)};")
+            written = uncommitted = 0
+            for frame in itertools.chain([first], frames):
+                assert (
+                    list(frame.columns) == columns
+                ), "All frames must have the same columns"
+                values = [
+                    _coerce_series(frame[column], dtype)
+                    for (column, _), dtype in zip(selected, types)
+                ]
+                count = _execute_chunked(
+                    cur, make_command, zip(*values), width, batch_size
+                )
+                written += count
+                uncommitted += count
+                if commit_rows and uncommitted >= commit_rows:
+                    cur.connection.commit()
+                    uncommitted = 0
+                    self.logger.debug("Imported %d rows into %s", written, table)
+            for _, sql in indexes:
+                cur.execute(sql)
+            return written
+
+        return self._write(table, load, kind="import", deferrable=False)
+
+    def import_csv(
+        self,
+        table: str,
+        path: str,
+        chunksize: int = 100000,
+        column_map: dict = None,
+        batch_size: int = None,
+        commit_rows: int = None,
+        rebuild_indexes: bool = False,
+        **read_csv_kwargs,
+    ):
+        """
+        Stream a CSV file into `table`, `chunksize` lines at a time.
+        Extra keyword arguments are passed to `pandas.read_csv`;
+        see `import_dataframe` for the rest.
+        """
+        with pd.read_csv(path, chunksize=chunksize, **read_csv_kwargs) as reader:
+            return self.import_dataframe(
+                table, reader, column_map, batch_size, commit_rows, rebuild_indexes
+            )
 
     def update_rows(self, table: str, update_info: dict):
+        """
+        Update rows of `table` matched on key values.
+
+        'update_info' should include the following information:
+            'keys': Fields used to find the rows to update
+            'update fields': Fields to be updated
+            'update values': Iterable of paired tuples, (key values, new field values)
+
+        All updates share one prepared statement and are applied in a single
+        transaction. Returns the number of rows affected.
+        """
 
-        insert_command = f'UPDATE "{table}" '
         key_fields = update_info["keys"]
         update_fields = update_info["update fields"]
-        new_values = update_info["update values"]
-        for nv in new_values:
-            assert len(key_fields) == len(
-                nv[0]
-            ), "Mismatch in key search parameters, aborting"
-            assert len(update_fields) == len(
-                nv[1]
-            ), "Mismatch in update field parameters, aborting"
-            set_values = " AND ".join(
-                ['"{}" = "{}"'.format(a, b) for a, b in zip(update_fields, nv[1])]
-            ).rstrip(" AND ")
-            where_values = " AND ".join(
-                ['"{}" = "{}"'.format(a, b) for a, b in zip(key_fields, nv[0])]
-            ).rstrip(" AND ")
-            cmd = insert_command + "SET {} WHERE {};".format(
-                set_values,
-                where_values,
+        update_command = "UPDATE {} SET {} WHERE {};".format(
+            _quote(table),
+            ", ".join(f"{_quote(field)} = ?" for field in update_fields),
+            " AND ".join(f"{_quote(field)} = ?" for field in key_fields),
+        )
+
+        new_values = self._snapshot(update_info["update values"])
+
+        def parameters():
+            for nv in new_values:
+                assert len(key_fields) == len(
+                    nv[0]
+                ), "Mismatch in key search parameters, aborting"
+                assert len(update_fields) == len(
+                    nv[1]
+                ), "Mismatch in update field parameters, aborting"
+                yield (*nv[1], *nv[0])
+
+        def update(cur):
+            cur.executemany(update_command, parameters())
+            return max(cur.rowcount, 0)
+
+        self.logger.debug("Issuing update command\n\t ---> %s", update_command)
+        return self._write(table, update, _count(new_values), "update")
+
+    def delete_rows(self, table: str, fields: list, data, batch_size: int = None):
+        """
+        Delete rows of `table` whose `fields` match any of the tuples in `data`.
+
+        Matching values are sent as bound row-value `IN` lists, chunked to the
+        connection's variable limit, and all chunks are deleted in a single
+        transaction. Returns the number of rows deleted.
+        """
+        self.logger.debug("Found a deletion field list %s", fields)
+        width = len(fields)
+        if width == 1:
+            target = _quote(fields[0])
+            row_values = "?"
+        else:
+            target = "({})".format(", ".join(_quote(field) for field in fields))
+            row_values = "({})".format(", ".join("?" * width))
+        deletion_cmd = "DELETE FROM {} WHERE {} IN ".format(_quote(table), target)
+        if width == 1:
+            make_command = lambda n: deletion_cmd + "({});".format(
+                ", ".join([row_values] * n)
             )
-            self.logger.debug(f"Issuing insertion command\n\t ---> {cmd}")
-            try:
-                _execute_command(self.cur, cmd)
-            except Exception as e:
-                raise e
-        self.conn.commit()
-
-    def delete_rows(self, table: str, fields: list, data: list):
-        deletion_cmd = f'DELETE FROM "{table}" WHERE '  #  ({}) == {};'
-        self.logger.debug(f"Found a deletion field list {fields}")
-        for item in data:
-            assert len(item) == len(
-                fields
-            ), f"Mismatch in deletion fields {fields} with query {item}. Aborting."
-            cmd = deletion_cmd
-            for idx, i in enumerate(item):
-                cmd += '("{}") == "{}" AND '.format(fields[idx], i)
-            cmd = cmd.rstrip(" AND ")
-            cmd += ";"
-            self.logger.debug("Running deletion command {}".format(cmd))
-            try:
-                _execute_command(self.cur, cmd)
-            except Exception as e:
-                raise
-            self.conn.commit()
+        else:
+            make_command = lambda n: deletion_cmd + "(VALUES {});".format(
+                ", ".join([row_values] * n)
+            )
+        self.logger.debug("Running deletion command %s", lazy(make_command, 1))
+        data = self._snapshot(data)
+        return self._write(
+            table,
+            lambda cur: _execute_chunked(cur, make_command, data, width, batch_size),
+            _count(data),
+            "delete",
+        )
 
-    def retrieve_rows(self, query: str):
+    def retrieve_rows(self, query: str, params=()):
         """
         query: Must be a well-formed query for the SQLite database
         (I assume too much complexity is possible from applications, here
          so I leave simplicity/compexity of implementation to the application.
          This package only handles the cursor/connection itself)
+        params: Optional values for any placeholders in `query`
         """
-        self.logger.debug(f"Received data query \n\t---> {query}")
+        self.logger.debug("Received data query \n\t---> %s", query)
+        if self.advisor is not None:
+            self.advisor.observe(query, params)
+
+        def read():
+            with self._reading() as conn:
+                return _retrieve_data(conn.cursor(), query, params)
+
         try:
-            return _retrieve_data(self.cur, query)
+            return self._cached_read(
+                "rows", query, params, self._timed_read("select", query, params, read)
+            )
         except Exception as e:
             raise
 
+    def iter_rows(
+        self, query: str, params=(), batch_size: int = 1000, batches: bool = False
+    ):
+        """
+        Stream the results of `query`, fetching `batch_size` rows at a time.
+
+        Yields single rows, or lists of up to `batch_size` rows if `batches` is set.
+        Runs on its own cursor, so the shared cursor stays free while iterating.
+        In pooled mode, a reader connection is held until iteration finishes;
+        otherwise the shared connection is only locked while fetching each batch,
+        so writes (and `flush`) may be made while iterating.
+        """
+        assert batch_size > 0, "Batch size must be a positive integer"
+        self.logger.debug("Streaming data query \n\t---> %s", query)
+        if self.advisor is not None:
+            self.advisor.observe(query, params)
+        fetched = self._fetch_batches(query, params, batch_size)
+        try:
+            for rows in self._timed_stream("select", query, params, fetched):
+                if batches:
+                    yield rows
+                else:
+                    yield from rows
+        finally:
+            fetched.close()
+
+    def _scan_ranges(self, table: str, partitions: int):
+        """
+        Conditions splitting `table` into (up to) `partitions` ranges of rowids,
+        or, for WITHOUT ROWID tables, of values of the first key field
+        """
+        with self._reading() as conn:
+            cur = conn.cursor()
+            try:
+                low, high = _retrieve_data(
+                    cur, "SELECT min(rowid), max(rowid) FROM {};".format(_quote(table))
+                )[0]
+                column = "{}.rowid".format(_quote(table))
+                if low is None:
+                    return ["1"]
+                step = -(-(high - low + 1) // partitions)
+                bounds = list(range(low, high + 1, step))
+                literals = [str(bound) for bound in bounds]
+            except sqlite3.OperationalError:
+                # WITHOUT ROWID: split on quantiles of the first key field
+                key = _quote(self.meta_info["tables"][table]["keys"][0])
+                column = "{}.{}".format(_quote(table), key)
+                rows = _retrieve_data(
+                    cur, "SELECT count(*) FROM {};".format(_quote(table))
+                )[0][0]
+                quantile = "SELECT quote({0}) FROM {1} ORDER BY {0} LIMIT 1 OFFSET ?;"
+                literals = []
+                for i in range(partitions):
+                    bound = _retrieve_data(
+                        cur,
+                        quantile.format(key, _quote(table)),
+                        (i * rows // partitions,),
+                    )
+                    if bound and bound[0][0] not in literals:
+                        literals.append(bound[0][0])
+                if not literals:
+                    return ["1"]
+            finally:
+                cur.close()
+        conditions = []
+        for i, literal in enumerate(literals):
+            terms = []
+            if i:
+                terms.append(f"{column} >= {literal}")
+            if i + 1 < len(literals):
+                terms.append(f"{column} < {literals[i + 1]}")
+            conditions.append(" AND ".join(terms) or "1")
+        return conditions
+
+    def parallel_scan(
+        self,
+        table: str,
+        query: str = None,
+        params=(),
+        partitions: int = None,
+        reduce=None,
+        executor=None,
+    ):
+        """
+        Run a read-only `query` over ranges of `table` in parallel worker processes.
+
+        `query` must contain a `{partition}` placeholder (eg, in its WHERE clause),
+        replaced by a condition selecting one range of `table`'s rowids (or, for
+        WITHOUT ROWID tables, of its first key field) [default: all fields of
+        `table`]. Each range is queried on its own read-only connection, and the
+        per-range rows are concatenated, or combined by `reduce(rows, rows)`
+        (eg, to add up partial aggregates). `params` must be picklable.
+
+        partitions: Number of ranges [default: number of CPUs]
+        executor: Optional (process) executor to run the ranges on
+            [default: a new process pool, one process per range]
+        """
+        if self.persister is not None:
+            # Workers read the database file, so bring it up to date
+            self.persister.persist()
+        assert os.path.isfile(self.db), "Parallel scans require a database file"
+        if query is None:
+            query = "SELECT * FROM {} WHERE {{partition}};".format(_quote(table))
+        assert "{partition}" in query, "Query must contain a {partition} placeholder"
+        if self.buffer is not None:
+            self.buffer.flush()
+        partitions = partitions or os.cpu_count() or 1
+        queries = [
+            query.replace("{partition}", f"({condition})")
+            for condition in self._scan_ranges(table, partitions)
+        ]
+        self.logger.debug("Scanning %s in %d ranges", table, len(queries))
+        pool = executor or ProcessPoolExecutor(max_workers=min(len(queries), partitions))
+        try:
+            futures = [
+                pool.submit(_scan_partition, self.db, partition_query, params)
+                for partition_query in queries
+            ]
+            results = [future.result() for future in futures]
+        finally:
+            if executor is None:
+                pool.shutdown()
+        if reduce is not None:
+            return functools.reduce(reduce, results)
+        return [row for rows in results for row in rows]
+
+    def suggest_indexes(self):
+        """
+        Index suggestions for sampled queries (requires 'index advisor') whose plans
+        fully scan a table of at least 'index advisor rows' rows. Each suggestion
+        lists the table, indexed columns (equality terms, a range term, sort order,
+        then the other referenced fields when few enough to cover the query), the
+        `CREATE INDEX` statement, and the queries and plans that prompted it.
+        Ordered by how often those queries ran.
+        """
+        assert self.advisor is not None, "Index advisor is not enabled"
+        return self.advisor.suggest()
+
+    def apply_index_suggestions(
+        self, suggestions: list = None, remeasure: bool = True, repeat: int = 3
+    ):
+        """
+        Create the indexes in `suggestions` (by default, all current suggestions).
+        If `remeasure` is set, each affected query is timed (median of `repeat`
+        runs) before and after, and its new plan recorded. Returns a report.
+        """
+        assert self.advisor is not None, "Index advisor is not enabled"
+        if suggestions is None:
+            suggestions = self.advisor.suggest()
+        return self.advisor.apply(suggestions, remeasure, repeat)
+
+    def backup(
+        self, target: str, pages: int = 256, sleep: float = 0.005, progress=None
+    ):
+        """
+        Online backup of the database to `target` (a path, relative to
+        'project dir' unless absolute), copied `pages` pages per step with a
+        `sleep` pause between steps, so that writers are not stalled.
+        The backup is written to a temporary file and moved into place once complete.
+        `progress(status, remaining, total)` is called after every step.
+        """
+        target = os.path.join(self.db_path, os.path.expanduser(target))
+        temporary_path = f"{target}.tmp"
+
+        def report(status, remaining, total):
+            self.logger.debug(
+                "Backup to %s: %d/%d pages copied", target, total - remaining, total
+            )
+            if progress is not None:
+                progress(status, remaining, total)
+
+        if self.persister is not None:
+            # Back up a snapshot, so the backup never holds the in-memory database
+            source, _ = self.persister.snapshot()
+        else:
+            # A dedicated connection, so the backup never holds the writer connection
+            source = sqlite3.connect(self.db)
+        destination = sqlite3.connect(temporary_path)
+        try:
+            source.backup(destination, pages=pages, progress=report, sleep=sleep)
+        finally:
+            destination.close()
+            source.close()
+        os.replace(temporary_path, target)
+        self.logger.info("Backed up %s to %s", self.db, target)
+
+    def export_rows(
+        self,
+        source: str,
+        path: str,
+        fmt: str = None,
+        params=(),
+        batch_size: int = 10000,
+        progress=None,
+    ):
+        """
+        Stream a table (or the results of a query) to a CSV or JSON-lines file.
+
+        source: Table name, or query
+        path: Output file; relative to 'project dir' unless absolute
+        fmt: 'csv' or 'jsonl' [default: from the file extension]
+        Rows are fetched `batch_size` at a time, so memory use is bounded.
+        `progress(rows_written)` is called after every batch.
+        Returns the number of rows written.
+        """
+        path = os.path.join(self.db_path, os.path.expanduser(path))
+        fmt = (fmt or os.path.splitext(path)[1].lstrip(".")).lower()
+        assert fmt in ("csv", "jsonl"), f"Unsupported export format {fmt}"
+        if source in self.meta_info["tables"]:
+            query = "SELECT * FROM {};".format(_quote(source))
+        else:
+            query = source
+        self.logger.debug("Exporting to %s\n\t---> %s", path, query)
+        written = 0
+        temporary_path = f"{path}.tmp"
+        names = []
+        batches = self._fetch_batches(query, params, batch_size, names)
+        with open(temporary_path, "w", newline="") as fp:
+            try:
+                rows = next(batches, [])
+                if fmt == "csv":
+                    writer = csv.writer(fp)
+                    writer.writerow(names)
+                while rows:
+                    if fmt == "csv":
+                        writer.writerows(rows)
+                    else:
+                        fp.writelines(
+                            json.dumps(dict(zip(names, row)), default=_json_value)
+                            + "\n"
+                            for row in rows
+                        )
+                    written += len(rows)
+                    if progress is not None:
+                        progress(written)
+                    rows = next(batches, [])
+            finally:
+                batches.close()
+        os.replace(temporary_path, path)
+        self.logger.info("Exported %d rows to %s", written, path)
+        return written
+
+    def enable_change_capture(self, tables: list = None):
+        """
+        Record every insert, update and delete on `tables` [default: all tables]
+        in the 'change log' table, via triggers (so changes made by any client are
+        captured). Each entry holds a monotonic sequence number, the table, the
+        operation ('insert', 'update' or 'delete') and the changed row's primary
+        key values (or rowid) as a JSON array; see `changes_since`.
+        Rows written by `insert_rows` (INSERT OR REPLACE) are logged as inserts.
+        """
+        create_tables = [
+            (
+                "CREATE TABLE IF NOT EXISTS {} ("
+                "seq INTEGER PRIMARY KEY AUTOINCREMENT, "
+                '"table" TEXT NOT NULL, '
+                "op TEXT NOT NULL, "
+                "keys TEXT NOT NULL, "
+                "ts REAL NOT NULL DEFAULT ((julianday('now') - 2440587.5) * 86400.0));"
+            ).format(_quote(_CHANGE_LOG)),
+            (
+                "CREATE TABLE IF NOT EXISTS {} ("
+                "consumer TEXT PRIMARY KEY, seq INTEGER NOT NULL);"
+            ).format(_quote(_CHANGE_CONSUMERS)),
+        ]
+        self._write(
+            _CHANGE_LOG, _statements(create_tables), kind="schema", deferrable=False
+        )
+        if tables is None:
+            tables = [
+                table
+                for table in self.get_tables()
+                if table not in (_CHANGE_LOG, _CHANGE_CONSUMERS)
+                and not table.startswith("sqlite_")
+            ]
+        statements = []
+        for table in tables:
+            keys = self.meta_info["tables"][table]["keys"] or ["rowid"]
+            statements.extend(_change_triggers(table, keys))
+        self.logger.debug("Capturing changes to tables %s", tables)
+        self._write(
+            _CHANGE_LOG, _statements(statements), kind="schema", deferrable=False
+        )
+        self._captured = None
+
+    def disable_change_capture(self, tables: list = None):
+        """Drop the change-capture triggers of `tables` [default: all tables]"""
+        triggers = self.retrieve_rows(
+            "SELECT name, tbl_name FROM sqlite_master "
+            "WHERE type = 'trigger' AND name LIKE 'change capture %';"
+        )
+        statements = [
+            f"DROP TRIGGER IF EXISTS {_quote(name)};"
+            for name, table in triggers
+            if tables is None or table in tables
+        ]
+        self._write(
+            _CHANGE_LOG, _statements(statements), kind="schema", deferrable=False
+        )
+        self._captured = None
+
+    def changes_since(
+        self, seq: int = 0, tables: list = None, batch_size: int = 1000
+    ):
+        """
+        Stream change log entries after sequence number `seq` (optionally only
+        for `tables`), in order, as (seq, table, op, key values, timestamp).
+        Consumers typically re-read the changed rows by key, and record the last
+        sequence number they processed with `acknowledge`.
+        """
+        query = 'SELECT seq, "table", op, keys, ts FROM {} WHERE seq > ?'.format(
+            _quote(_CHANGE_LOG)
+        )
+        params = [seq]
+        if tables:
+            query += ' AND "table" IN ({})'.format(", ".join("?" * len(tables)))
+            params.extend(tables)
+        query += " ORDER BY seq;"
+        for seq, table, op, keys, ts in self.iter_rows(query, params, batch_size):
+            yield seq, table, op, json.loads(keys), ts
+
+    def acknowledge(self, consumer: str, seq: int):
+        """Record that `consumer` has processed all changes up to `seq`"""
+        command = (
+            "INSERT INTO {} (consumer, seq) VALUES (?, ?) "
+            "ON CONFLICT (consumer) DO UPDATE SET seq = max(seq, excluded.seq);"
+        ).format(_quote(_CHANGE_CONSUMERS))
+
+        def acknowledge(cur):
+            cur.execute(command, (consumer, seq))
+            return cur.rowcount
+
+        return self._write(_CHANGE_CONSUMERS, acknowledge, kind="upsert")
+
+    def prune_changes(self, compact: bool = False):
+        """
+        Delete change log entries acknowledged by every consumer (nothing is
+        deleted until a consumer has acknowledged). With `compact`, of the
+        remaining entries only the latest per row is kept, which is sufficient
+        for consumers that re-read changed rows. Returns the number of entries
+        deleted. Sequence numbers are never reused.
+        """
+        log, consumers = _quote(_CHANGE_LOG), _quote(_CHANGE_CONSUMERS)
+        commands = [
+            f"DELETE FROM {log} WHERE seq <= (SELECT min(seq) FROM {consumers});"
+        ]
+        if compact:
+            commands.append(
+                f'DELETE FROM {log} WHERE seq NOT IN '
+                f'(SELECT max(seq) FROM {log} GROUP BY "table", keys);'
+            )
+
+        def prune(cur):
+            deleted = 0
+            for command in commands:
+                cur.execute(command)
+                deleted += max(cur.rowcount, 0)
+            return deleted
+
+        return self._write(_CHANGE_LOG, prune, kind="delete")
+
     def remove_tables(self):
         raise NotImplementedError("TBD!")
 
+    def _column_dtypes(self, names: list, query: str, table: str = None):
+        if table is None:
+            tables = _query_tables(query, self.meta_info["tables"])
+        else:
+            tables = [table]
+        declared = {}
+        for t in reversed(tables):
+            for field, (_, field_type) in self.meta_info["tables"][t]["fields"].items():
+                declared[field] = field_type
+        return [
+            _column_dtype(declared[name]) if name in declared else None
+            for name in names
+        ]
+
+    def fetch_columns(
+        self, query: str, params=(), table: str = None, batch_size: int = 10000
+    ):
+        """
+        Run `query` and return its results column-wise, as a dict of NumPy arrays.
+
+        Array types come from the declared types of the matching fields in
+        `table` (by default, the tables referenced by `query`), so no per-call
+        type inference is needed. Rows are fetched `batch_size` at a time
+        into pre-allocated arrays, rather than materialized as a list first.
+        """
+        read = lambda: self._fetch_columns(query, params, table, batch_size)
+        return self._timed_read("columns", query, params, read)()
+
+    def _fetch_columns(self, query: str, params, table: str, batch_size: int):
+        assert batch_size > 0, "Batch size must be a positive integer"
+        self.logger.debug("Received columnar query \n\t---> %s", query)
+        if self.advisor is not None:
+            self.advisor.observe(query, params)
+        with self._reading() as conn:
+            cur = conn.cursor()
+            try:
+                cur.execute(query, params)
+                names = [d[0] for d in cur.description]
+                dtypes = self._column_dtypes(names, query, table)
+                columns = [_ColumnBuilder(dtype, batch_size) for dtype in dtypes]
+                while True:
+                    rows = cur.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    for column, values in zip(columns, zip(*rows)):
+                        column.extend(values)
+            finally:
+                cur.close()
+        return {name: column.result() for name, column in zip(names, columns)}
+
+    def fetch_dataframe(
+        self, query: str, params=(), table: str = None, batch_size: int = 10000
+    ):
+        """DataFrame built from `fetch_columns` (see there for details)"""
+        return pd.DataFrame(self.fetch_columns(query, params, table, batch_size))
+
+    def iter_dataframes(
+        self, query: str, params=(), table: str = None, chunksize: int = 100000
+    ):
+        """
+        Stream the results of `query` as DataFrames of at most `chunksize` rows,
+        typed as in `fetch_columns`, for results larger than memory.
+        """
+        assert chunksize > 0, "Chunk size must be a positive integer"
+        self.logger.debug("Streaming columnar query \n\t---> %s", query)
+        if self.advisor is not None:
+            self.advisor.observe(query, params)
+        names = []
+        fetched = self._fetch_batches(query, params, chunksize, names)
+        try:
+            dtypes = None
+            for rows in self._timed_stream("frame", query, params, fetched):
+                if dtypes is None:
+                    dtypes = self._column_dtypes(names, query, table)
+                yield pd.DataFrame(
+                    {
+                        name: _column_array(values, dtype)
+                        for name, dtype, values in zip(names, dtypes, zip(*rows))
+                    }
+                )
+        finally:
+            fetched.close()
+
     def execute_pandas_query(self, command: str):
         # Execute a pandas-formatted query with table name known (fields optional)
         # ...What could go wrong?
+        if self.advisor is not None:
+            self.advisor.observe(command)
+
+        def read():
+            with self._reading() as conn:
+                return pd.read_sql_query(command, conn)
+
         try:
-            return pd.read_sql_query(command, self.conn)
+            return self._cached_read(
+                "frame", command, (), self._timed_read("frame", command, (), read)
+            )
         except Exception as e:
             raise
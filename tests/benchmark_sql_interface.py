@@ -0,0 +1,333 @@
+"""
+Benchmarks for SQLInterface operations.
+
+Builds a throwaway database from a schema script (by default the test schema in
+`sample_configs`), fills a table with synthetic rows generated from its declared
+field types, and measures throughput, per-call latency and peak (Python) memory
+of each operation over a sweep of row counts and batch sizes. Each measurement
+is repeated (on a fresh database each time, after untimed warmup runs), and the
+median is reported along with every repeat's latency.
+
+Results are written as JSON, and can be compared against a saved baseline:
+
+    python tests/benchmark_sql_interface.py --rows 1e3 1e5 --output new.json
+    python tests/benchmark_sql_interface.py --baseline old.json --output new.json
+
+Any operation whose median throughput drops (or whose peak memory grows) by more
+than `--threshold`, plus the run-to-run noise of both runs, relative to the
+baseline is reported, and the exit status is 1.
+Not collected by the unit test runner.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from pathlib import Path
+
+from utilities import SQLInterface
+
+OPERATIONS = (
+    "insert_rows",
+    "upsert_rows",
+    "update_rows",
+    "retrieve_rows",
+    "iter_rows",
+    "execute_pandas_query",
+    "fetch_dataframe",
+    "delete_rows",
+)
+
+
+def synthetic_value(field_type: str, field: str, index: int, rng: random.Random):
+    if "INT" in field_type:
+        return index
+    if any(t in field_type for t in ("REAL", "FLOA", "DOUB")):
+        return rng.uniform(0, 1000)
+    if "BLOB" in field_type:
+        return rng.randbytes(16)
+    return f"{field}-{index:010d}"
+
+
+def synthetic_rows(dbi: SQLInterface, table: str, rows: int, seed: int):
+    """Generator of rows for every field of `table`; key fields are unique per row"""
+    rng = random.Random(seed)
+    fields = dbi.meta_info["tables"][table]["fields"]
+    for index in range(rows):
+        yield tuple(
+            synthetic_value(field_type, field, index, rng)
+            for field, (_, field_type) in fields.items()
+        )
+
+
+def relative_noise(samples: list):
+    """Median absolute deviation of `samples`, relative to their median"""
+    median = statistics.median(samples)
+    if not median:
+        return 0.0
+    return statistics.median(abs(s - median) for s in samples) / median
+
+
+class Benchmark:
+    def __init__(self, schema: str, table: str, seed: int):
+        self.schema = os.path.abspath(schema)
+        self.table = table
+        self.seed = seed
+
+    def _interface(self):
+        project_dir = tempfile.mkdtemp(prefix="sql_benchmark_")
+        shutil.copy(self.schema, project_dir)
+        config = {
+            "project dir": project_dir,
+            "db config": os.path.basename(self.schema),
+            "db file": "benchmark.db",
+        }
+        return SQLInterface(config)
+
+    def _operations(self, dbi: SQLInterface, rows: int, batch_size: int):
+        """(name, callable) pairs, in execution order; each returns rows processed"""
+        table = self.table
+        info = dbi.meta_info["tables"][table]
+        fields = list(info["fields"])
+        keys = info["keys"] or fields[:1]
+        values = [f for f in fields if f not in keys] or fields[:1]
+        select = f'SELECT * FROM "{table}";'
+        key_index = [fields.index(k) for k in keys]
+        value_index = [fields.index(v) for v in values]
+
+        def key_values():
+            for row in synthetic_rows(dbi, table, rows, self.seed):
+                yield tuple(row[i] for i in key_index)
+
+        def updates():
+            for row in synthetic_rows(dbi, table, rows, self.seed + 1):
+                yield (
+                    tuple(row[i] for i in key_index),
+                    tuple(row[i] for i in value_index),
+                )
+
+        operations = {
+            "insert_rows": lambda: dbi.insert_rows(
+                table, fields, synthetic_rows(dbi, table, rows, self.seed), batch_size
+            ),
+            "upsert_rows": lambda: dbi.upsert_rows(
+                table, fields, synthetic_rows(dbi, table, rows, self.seed), batch_size
+            ),
+            "update_rows": lambda: dbi.update_rows(
+                table,
+                {"keys": keys, "update fields": values, "update values": updates()},
+            ),
+            "retrieve_rows": lambda: len(dbi.retrieve_rows(select)),
+            "iter_rows": lambda: sum(
+                len(b)
+                for b in dbi.iter_rows(select, batch_size=batch_size or 1000, batches=True)
+            ),
+            "execute_pandas_query": lambda: len(dbi.execute_pandas_query(select)),
+            "fetch_dataframe": lambda: len(
+                dbi.fetch_dataframe(select, batch_size=batch_size or 10000)
+            ),
+            "delete_rows": lambda: dbi.delete_rows(
+                table, keys, key_values(), batch_size
+            ),
+        }
+        if not info["keys"]:
+            operations.pop("upsert_rows")
+        return [(name, operations[name]) for name in OPERATIONS if name in operations]
+
+    def _pass(self, rows: int, batch_size: int, traced: bool = False):
+        """
+        Run every operation once, in order, on a fresh database; returns
+        {name: (rows processed, seconds)}, or {name: peak memory bytes} if `traced`
+        """
+        measured = {}
+        dbi = self._interface()
+        try:
+            for name, operation in self._operations(dbi, rows, batch_size):
+                if traced:
+                    tracemalloc.start()
+                    operation()
+                    _, peak = tracemalloc.get_traced_memory()
+                    tracemalloc.stop()
+                    measured[name] = peak
+                    continue
+                start = time.perf_counter()
+                processed = operation()
+                measured[name] = (processed, time.perf_counter() - start)
+        finally:
+            dbi.close()
+            shutil.rmtree(dbi.db_path, ignore_errors=True)
+        return measured
+
+    def run(
+        self,
+        rows: int,
+        batch_size: int,
+        memory: bool = True,
+        repeats: int = 5,
+        warmup: int = 1,
+    ):
+        assert repeats > 0, "At least one repeat is needed"
+        for _ in range(warmup):
+            self._pass(rows, batch_size)
+        timings = [self._pass(rows, batch_size) for _ in range(repeats)]
+        peaks = self._pass(rows, batch_size, traced=True) if memory else {}
+        results = []
+        for name, (processed, _) in timings[0].items():
+            seconds = [timing[name][1] for timing in timings]
+            median = statistics.median(seconds)
+            results.append(
+                {
+                    "operation": name,
+                    "rows": rows,
+                    "batch size": batch_size,
+                    "rows processed": processed,
+                    "repeats": repeats,
+                    "seconds": median,
+                    "seconds per repeat": seconds,
+                    "noise": relative_noise(seconds),
+                    "rows per s": rows / median if median else float("inf"),
+                    "peak memory bytes": peaks.get(name),
+                }
+            )
+        return results
+
+
+def _result_key(result: dict):
+    return (result["operation"], result["rows"], result["batch size"])
+
+
+def compare(results: list, baseline: list, threshold: float):
+    """
+    Regressions of `results` relative to `baseline`, as printable strings.
+    Throughput (of medians) is flagged once it drops by more than `threshold`
+    plus the relative noise of both runs.
+    """
+    previous = {_result_key(r): r for r in baseline}
+    regressions = []
+    for result in results:
+        before = previous.get(_result_key(result))
+        if before is None:
+            continue
+        label = "{} (rows={}, batch size={})".format(*_result_key(result))
+        tolerance = threshold + result.get("noise", 0) + before.get("noise", 0)
+        if result["rows per s"] < before["rows per s"] * (1 - tolerance):
+            regressions.append(
+                f"{label}: throughput {before['rows per s']:.0f} -> "
+                f"{result['rows per s']:.0f} rows/s (tolerance {tolerance:.0%})"
+            )
+        if (
+            result["peak memory bytes"] is not None
+            and before.get("peak memory bytes")
+            and result["peak memory bytes"]
+            > before["peak memory bytes"] * (1 + threshold)
+        ):
+            regressions.append(
+                f"{label}: peak memory {before['peak memory bytes']} -> "
+                f"{result['peak memory bytes']} bytes"
+            )
+    return regressions
+
+
+def main(argv=None):
+    test_path = Path(__file__).resolve().parent
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--rows",
+        nargs="+",
+        type=float,
+        default=[1e3, 1e4, 1e5],
+        help="Row counts to sweep (eg, 1e3 1e4 1e5 1e6 1e7)",
+    )
+    parser.add_argument(
+        "--batch-sizes",
+        nargs="+",
+        type=int,
+        default=[0, 1000],
+        help="Batch sizes to sweep (0: the interface's default)",
+    )
+    parser.add_argument(
+        "--schema",
+        default=str(test_path / "sample_configs" / "test_db.sql"),
+        help="SQL script defining the benchmark database",
+    )
+    parser.add_argument("--table", default="bananas foster", help="Table to benchmark")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument(
+        "--repeats",
+        type=int,
+        default=5,
+        help="Timed runs per measurement; the median is reported [default 5]",
+    )
+    parser.add_argument(
+        "--warmup", type=int, default=1, help="Untimed runs beforehand [default 1]"
+    )
+    parser.add_argument(
+        "--skip-memory", action="store_true", help="Skip the (traced) memory pass"
+    )
+    parser.add_argument("--output", help="Write JSON results to this path")
+    parser.add_argument("--baseline", help="JSON results to compare against")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.10,
+        help="Relative change flagged as a regression [default 0.10]",
+    )
+    args = parser.parse_args(argv)
+
+    benchmark = Benchmark(args.schema, args.table, args.seed)
+    results = []
+    for rows in args.rows:
+        for batch_size in args.batch_sizes:
+            for result in benchmark.run(
+                int(rows),
+                batch_size or None,
+                memory=not args.skip_memory,
+                repeats=args.repeats,
+                warmup=args.warmup,
+            ):
+                results.append(result)
+                repeats = " ".join(f"{s:.4f}" for s in result["seconds per repeat"])
+                print(
+                    f"{result['operation']:<22}{result['rows']:>10} rows  "
+                    f"batch {str(result['batch size']):>6}  "
+                    f"{result['seconds']:>9.4f} s (±{result['noise']:.0%})  "
+                    f"{result['rows per s']:>12.0f} rows/s  "
+                    f"peak {result['peak memory bytes'] or 0:>12} B  [{repeats}]"
+                )
+
+    report = {
+        "meta": {
+            "time": time.time(),
+            "python": sys.version,
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "arguments": vars(args),
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as fp:
+            json.dump(report, fp, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, "r") as fp:
+            baseline = json.load(fp)["results"]
+        regressions = compare(results, baseline, args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION: {regression}")
+        if regressions:
+            return 1
+        print("No regressions against baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,392 @@
+import errno
+import glob
+import gzip
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+import numpy as np
+
+from unittest import mock
+
+from utilities import (
+    BoundedQueueHandler,
+    BufferedRotatingFileHandler,
+    DummyLogger,
+    DuplicateCollapseFilter,
+    RateLimitFilter,
+    SamplingFilter,
+    create_logger,
+    create_silent_logger,
+    lazy,
+    stop_queue_logging,
+)
+
+
+def make_record(msg: str, *args, level=logging.INFO, lineno: int = 1):
+    return logging.LogRecord("test", level, __file__, lineno, msg, args, None)
+
+
+class ListHandler(logging.Handler):
+    """Collects formatted messages"""
+
+    def __init__(self):
+        super().__init__()
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(self.format(record))
+
+
+class TestLazyLogging(unittest.TestCase):
+    def setUp(self):
+        self.logger = logging.getLogger("LazyLoggingTest")
+        self.logger.propagate = False
+        self.handler = ListHandler()
+        self.logger.addHandler(self.handler)
+
+    def tearDown(self):
+        self.logger.removeHandler(self.handler)
+
+    def test_lazy_arguments(self):
+        print(f"\n{'*'*20}{'Testing lazy log arguments':^40}{'*'*20}")
+        self.logger.setLevel(logging.INFO)
+        summarize = mock.Mock(return_value="summary")
+        self.logger.debug("Rows: %s", lazy(summarize, [1, 2], limit=1))
+        summarize.assert_not_called()
+        # Computed once, however many handlers format the record
+        second = ListHandler()
+        self.logger.addHandler(second)
+        self.logger.info("Rows: %s", lazy(summarize, [1, 2], limit=1))
+        self.logger.removeHandler(second)
+        summarize.assert_called_once_with([1, 2], limit=1)
+        self.assertEqual(self.handler.messages, ["Rows: summary"])
+        self.assertEqual(second.messages, ["Rows: summary"])
+
+    def test_level_changes(self):
+        print(f"\n{'*'*20}{'Testing level changes':^40}{'*'*20}")
+        self.logger.setLevel(logging.INFO)
+        self.assertFalse(self.logger.isEnabledFor(logging.DEBUG))
+        # The cached level check is cleared by setLevel
+        self.logger.setLevel(logging.DEBUG)
+        self.assertTrue(self.logger.isEnabledFor(logging.DEBUG))
+        summarize = mock.Mock(return_value="summary")
+        self.logger.debug("Rows: %s", lazy(summarize))
+        self.assertEqual(summarize.call_count, 1)
+        self.logger.setLevel(logging.WARNING)
+        self.assertFalse(self.logger.isEnabledFor(logging.INFO))
+
+    def test_dummy_logger(self):
+        print(f"\n{'*'*20}{'Testing silent loggers':^40}{'*'*20}")
+        summarize = mock.Mock(return_value="summary")
+        dummy = DummyLogger("DummyLoggerTest")
+        options = {"exc_info": True, "stack_info": True, "extra": {"user": "x"}}
+        for method in (dummy.debug, dummy.info, dummy.warning, dummy.error):
+            method("Rows: %s (%d)", lazy(summarize), 2, **options)
+        dummy.critical("Rows: %s", lazy(summarize), **options)
+        dummy.exception("Rows: %s", lazy(summarize), **options)
+        dummy.log(logging.ERROR, "Rows: %s", lazy(summarize), **options)
+        self.assertFalse(dummy.isEnabledFor(logging.CRITICAL))
+        create_silent_logger("SilentLoggerTest", {"stdout_log": False})
+        silent = logging.getLogger("SilentLoggerTest")
+        self.assertIsInstance(silent, DummyLogger)
+        silent.error("Rows: %s", lazy(summarize))
+        summarize.assert_not_called()
+
+
+class TestQueueLogging(unittest.TestCase):
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.log_dir = tempfile.mkdtemp(prefix="log_utilities_")
+        os.chdir(self.log_dir)
+
+    def tearDown(self):
+        stop_queue_logging()
+        os.chdir(self.cwd)
+        shutil.rmtree(self.log_dir, ignore_errors=True)
+
+    def queued(self, handler):
+        return [record.getMessage() for record in list(handler.queue.queue)]
+
+    def test_drop_policies(self):
+        print(f"\n{'*'*20}{'Testing queue overflow (drop)':^40}{'*'*20}")
+        records = [make_record("record %d", i) for i in range(5)]
+        drop = BoundedQueueHandler(queue_size=2, overflow="drop")
+        drop_oldest = BoundedQueueHandler(queue_size=2, overflow="drop_oldest")
+        for record in records:
+            drop.handle(record)
+            drop_oldest.handle(record)
+        self.assertEqual(self.queued(drop), ["record 0", "record 1"])
+        self.assertEqual(self.queued(drop_oldest), ["record 3", "record 4"])
+        self.assertEqual((drop.dropped, drop_oldest.dropped), (3, 3))
+        with self.assertRaises(AssertionError):
+            BoundedQueueHandler(overflow="spill")
+
+    def test_block_policy(self):
+        print(f"\n{'*'*20}{'Testing queue overflow (block)':^40}{'*'*20}")
+        handler = BoundedQueueHandler(queue_size=1, overflow="block")
+        handler.handle(make_record("first"))
+        blocked = threading.Thread(
+            target=handler.handle, args=(make_record("second"),), daemon=True
+        )
+        blocked.start()
+        blocked.join(timeout=0.2)
+        self.assertTrue(blocked.is_alive())
+        self.assertEqual(handler.queue.get().getMessage(), "first")
+        blocked.join(timeout=5)
+        self.assertFalse(blocked.is_alive())
+        self.assertEqual(self.queued(handler), ["second"])
+        self.assertEqual(handler.dropped, 0)
+
+    def test_drain_on_stop(self):
+        print(f"\n{'*'*20}{'Testing queue draining':^40}{'*'*20}")
+        config = {
+            "queue_log": True,
+            "queue_size": 50,
+            "stdout_log": False,
+            "file_log": True,
+            "format string": "%(message)s",
+        }
+        create_logger("QueueDrainTest", config)
+        logger = logging.getLogger("QueueDrainTest")
+        for i in range(1000):
+            logger.info("message %d", i)
+        stop_queue_logging("QueueDrainTest")
+        self.assertFalse(
+            any(isinstance(h, BoundedQueueHandler) for h in logger.handlers)
+        )
+        with open("QueueDrainTest.log") as fp:
+            lines = fp.read().splitlines()
+        self.assertEqual(lines, [f"message {i}" for i in range(1000)])
+
+
+class TestBufferedRotatingFileHandler(unittest.TestCase):
+    def setUp(self):
+        self.log_dir = tempfile.mkdtemp(prefix="log_utilities_")
+        self.path = os.path.join(self.log_dir, "test.log")
+        self.handlers = []
+
+    def tearDown(self):
+        for handler in self.handlers:
+            handler.close()
+        shutil.rmtree(self.log_dir, ignore_errors=True)
+
+    def handler(self, **kwargs):
+        options = {"flush_interval": 0, "flush_level": logging.CRITICAL}
+        handler = BufferedRotatingFileHandler(self.path, **{**options, **kwargs})
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        self.handlers.append(handler)
+        return handler
+
+    def written(self, path=None):
+        with open(path or self.path) as fp:
+            return fp.read().splitlines()
+
+    def segments(self):
+        return sorted(glob.glob(glob.escape(self.path) + ".*"))
+
+    def test_flush_on_size(self):
+        print(f"\n{'*'*20}{'Testing buffered flush (size)':^40}{'*'*20}")
+        handler = self.handler(buffer_bytes=35)
+        for i in range(3):
+            handler.handle(make_record("message %d", i))
+        self.assertEqual(self.written(), [])
+        handler.handle(make_record("message 3"))
+        self.assertEqual(self.written(), [f"message {i}" for i in range(4)])
+
+    def test_flush_on_level(self):
+        print(f"\n{'*'*20}{'Testing buffered flush (level)':^40}{'*'*20}")
+        handler = self.handler(flush_level=logging.ERROR)
+        handler.handle(make_record("info"))
+        self.assertEqual(self.written(), [])
+        handler.handle(make_record("error", level=logging.ERROR))
+        self.assertEqual(self.written(), ["info", "error"])
+
+    def test_flush_on_interval(self):
+        print(f"\n{'*'*20}{'Testing buffered flush (interval)':^40}{'*'*20}")
+        handler = self.handler(flush_interval=0.05)
+        handler.handle(make_record("info"))
+        deadline = time.monotonic() + 5
+        while not self.written() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(self.written(), ["info"])
+
+    def test_rotate_on_size(self):
+        print(f"\n{'*'*20}{'Testing rotation (size)':^40}{'*'*20}")
+        handler = self.handler(buffer_bytes=0, max_bytes=20, compress=False)
+        for i in range(5):
+            handler.handle(make_record("message %d", i))
+        handler.close()
+        # 10 bytes per record: every other record starts a new file
+        segments = self.segments()
+        self.assertEqual(len(segments), 2)
+        self.assertEqual(
+            [self.written(segment) for segment in segments],
+            [["message 0", "message 1"], ["message 2", "message 3"]],
+        )
+        self.assertEqual(self.written(), ["message 4"])
+
+    def test_rotate_on_time(self):
+        print(f"\n{'*'*20}{'Testing rotation (time)':^40}{'*'*20}")
+        handler = self.handler(buffer_bytes=0, rotate_interval=60, compress=False)
+        handler.handle(make_record("early"))
+        self.assertEqual(self.segments(), [])
+        with mock.patch("time.time", return_value=time.time() + 61):
+            handler.handle(make_record("late"))
+        handler.close()
+        self.assertEqual([self.written(s) for s in self.segments()], [["early", "late"]])
+        self.assertEqual(self.written(), [])
+
+    def test_compression_and_pruning(self):
+        print(f"\n{'*'*20}{'Testing rotated segment cleanup':^40}{'*'*20}")
+        handler = self.handler(buffer_bytes=0, max_bytes=1, backup_count=3)
+        # Rotations within a second get numeric suffixes (.1, .2, ..., .10, ...)
+        with mock.patch("time.strftime", return_value="20240101-120000"):
+            for i in range(12):
+                handler.handle(make_record("message %d", i))
+            handler.close()
+        segments = self.segments()
+        self.assertEqual(
+            [os.path.basename(s) for s in segments],
+            [f"test.log.20240101-120000.{i}.gz" for i in (10, 11, 9)],
+        )
+        kept = set()
+        for segment in segments:
+            with gzip.open(segment, "rt") as fp:
+                kept.update(fp.read().splitlines())
+        self.assertEqual(kept, {"message 9", "message 10", "message 11"})
+
+    def test_segment_errors(self):
+        print(f"\n{'*'*20}{'Testing rotated segment errors':^40}{'*'*20}")
+        handler = self.handler(buffer_bytes=0, max_bytes=1)
+        with mock.patch.object(handler, "_remove_old_segments", side_effect=OSError):
+            with mock.patch.object(handler, "handleError") as handle_error:
+                handler.handle(make_record("message"))
+                handler.close()
+        record = handle_error.call_args[0][0]
+        self.assertIn("Failed to process rotated log segment", record.getMessage())
+
+    def test_write_errors(self):
+        print(f"\n{'*'*20}{'Testing file sink write errors':^40}{'*'*20}")
+        handler = self.handler(buffer_bytes=0)
+        full = OSError(errno.ENOSPC, "No space left on device")
+        with mock.patch.object(handler, "handleError") as handle_error:
+            with mock.patch.object(handler.stream, "write", side_effect=full):
+                # Reported, not raised to the logging call; the buffer is dropped
+                handler.handle(make_record("lost"))
+            self.assertEqual(handle_error.call_count, 1)
+            self.assertEqual(handler._pending, [])
+            handler.handle(make_record("kept"))
+        self.assertEqual(self.written(), ["kept"])
+
+    def test_flusher_survives_errors(self):
+        print(f"\n{'*'*20}{'Testing file sink flusher errors':^40}{'*'*20}")
+        handler = self.handler(flush_interval=0.01)
+        with mock.patch.object(handler, "handleError") as handle_error:
+            with mock.patch.object(handler.stream, "write", side_effect=OSError):
+                handler.handle(make_record("lost"))
+                deadline = time.monotonic() + 5
+                while not handle_error.called and time.monotonic() < deadline:
+                    time.sleep(0.01)
+            self.assertIn("Failed to write", handle_error.call_args[0][0].getMessage())
+            self.assertTrue(handler._flusher.is_alive())
+            handler.handle(make_record("kept"))
+            deadline = time.monotonic() + 5
+            while not self.written() and time.monotonic() < deadline:
+                time.sleep(0.01)
+        self.assertEqual(self.written(), ["kept"])
+
+    def test_rotation_errors(self):
+        print(f"\n{'*'*20}{'Testing file sink rotation errors':^40}{'*'*20}")
+        handler = self.handler(buffer_bytes=0, max_bytes=1, compress=False)
+        with mock.patch.object(handler, "handleError") as handle_error:
+            with mock.patch("os.replace", side_effect=PermissionError):
+                handler.handle(make_record("first"))
+            self.assertEqual(handle_error.call_count, 1)
+            # The file was reopened, and rotates once it can
+            handler.handle(make_record("second"))
+        handler.close()
+        self.assertEqual([self.written(s) for s in self.segments()], [["first", "second"]])
+
+
+class TestLogFilters(unittest.TestCase):
+    def setUp(self):
+        self.now = 0.0
+        clock = mock.patch(
+            "utilities.log_utilities.time.monotonic", side_effect=lambda: self.now
+        )
+        clock.start()
+        self.addCleanup(clock.stop)
+
+    def passed(self, log_filter, records):
+        return [record.getMessage() for record in records if log_filter.filter(record)]
+
+    def test_rate_limit(self):
+        print(f"\n{'*'*20}{'Testing rate limiting':^40}{'*'*20}")
+        rate_limit = RateLimitFilter(rate=1, burst=2)
+        burst = [make_record("tick %d", i) for i in range(5)]
+        self.assertEqual(self.passed(rate_limit, burst), ["tick 0", "tick 1"])
+        # Other call sites have their own budget
+        self.assertTrue(rate_limit.filter(make_record("elsewhere", lineno=2)))
+        self.now = 0.5
+        self.assertFalse(rate_limit.filter(make_record("tick 5")))
+        self.now = 1.5
+        self.assertEqual(
+            self.passed(rate_limit, [make_record("tick 6"), make_record("tick 7")]),
+            ["tick 6 [4 similar messages suppressed]"],
+        )
+        self.now = 10.0
+        self.assertEqual(
+            self.passed(rate_limit, [make_record("tick %d", i) for i in range(3)]),
+            ["tick 0 [1 similar messages suppressed]", "tick 1"],
+        )
+
+    def test_sampling(self):
+        print(f"\n{'*'*20}{'Testing sampling':^40}{'*'*20}")
+        sampling = SamplingFilter({"DEBUG": 0.25})
+        records = [make_record("debug %d", i, level=logging.DEBUG) for i in range(4)]
+        with mock.patch(
+            "utilities.log_utilities.random.random", side_effect=[0.1, 0.3, 0.2, 0.9]
+        ) as draw:
+            self.assertEqual(self.passed(sampling, records), ["debug 0", "debug 2"])
+            self.assertTrue(sampling.filter(make_record("info")))
+        self.assertEqual(draw.call_count, 4)
+
+    def test_duplicate_collapse(self):
+        print(f"\n{'*'*20}{'Testing duplicate collapsing':^40}{'*'*20}")
+        collapse = DuplicateCollapseFilter(interval=10)
+        formatted = []
+
+        class Argument:
+            def __str__(self):
+                formatted.append(self)
+                return "arg"
+
+        argument = Argument()
+        self.assertTrue(collapse.filter(make_record("value %s", argument)))
+        for self.now in (1.0, 2.0, 3.0):
+            self.assertFalse(collapse.filter(make_record("value %s", argument)))
+        # Suppressed records are never formatted
+        self.assertEqual(formatted, [])
+        self.now = 11.0
+        self.assertEqual(
+            self.passed(collapse, [make_record("value %s", argument)]),
+            ["value arg [repeated 4 times]"],
+        )
+        self.now = 12.0
+        self.assertFalse(collapse.filter(make_record("value %s", argument)))
+        self.assertEqual(
+            self.passed(collapse, [make_record("value %s", "other")]),
+            ["value other [previous message repeated 1 times]"],
+        )
+        # Arguments without plain equality are compared safely (never collapsed)
+        self.assertTrue(collapse.filter(make_record("value %s", np.arange(3))))
+        self.assertTrue(collapse.filter(make_record("value %s", np.arange(3))))
+
+
+if __name__ == "__main__":
+    unittest.main()
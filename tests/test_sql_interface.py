@@ -2,15 +2,24 @@ from dataclasses import fields
 from posixpath import basename
 from typing import Type
 import unittest
+import asyncio
+import io
 import json
 import numpy as np
 from numpy.core.fromnumeric import mean, std
 import numpy.random as npr
+import pandas as pd
 
 npr.seed(42)
 import os
+import shutil
+import sqlite3
 import string
+import tempfile
+import threading
+import time
 
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 from utilities import (
@@ -18,7 +27,10 @@ from utilities import (
     validate_config,
     remove_file,
     SQLInterface,
+    AsyncSQLInterface,
+    ShardedSQLInterface,
 )
+from utilities.sharded_sql_interface import _shard_value
 
 # Import appropriate exception from sqlite
 from sqlite3 import IntegrityError
@@ -280,5 +292,794 @@ class TestSQLInterface(unittest.TestCase):
         pass
 
 
+def temporary_config(test_path: Path):
+    """Configuration for a throwaway database in a fresh temporary directory"""
+    project_dir = tempfile.mkdtemp(prefix="sql_interface_")
+    shutil.copy(os.path.join(test_path, "sample_configs", "test_db.sql"), project_dir)
+    return {
+        "project dir": project_dir,
+        "db config": "test_db.sql",
+        "db file": "test.db",
+    }
+
+
+class TestBatchedOperations(unittest.TestCase):
+
+    test_path = Path(__file__).resolve().parent
+
+    def setUp(self):
+        self.config = temporary_config(self.__class__.test_path)
+        self.dbi = SQLInterface(self.config)
+
+    def tearDown(self):
+        self.dbi.close()
+        shutil.rmtree(self.config["project dir"], ignore_errors=True)
+
+    def test_insert_rows_from_generator(self):
+        print(f"\n{'*'*20}{'Testing chunked insertion':^40}{'*'*20}")
+        fields = self.dbi.get_all_table_fields("bananas foster")
+        rows = ((float(i), f"it's \"quoted\" {i}", f"K{i:04d}") for i in range(103))
+        inserted = self.dbi.insert_rows("bananas foster", fields, rows, batch_size=10)
+        self.assertEqual(inserted, 103)
+        results = self.dbi.retrieve_rows('SELECT dave FROM "bananas foster" WHERE erin = \'K0042\';')
+        self.assertEqual(results, [('it\'s "quoted" 42',)])
+        # Default chunking: a single short chunk, exact multiples, and a remainder
+        for count in (1, 256, 600):
+            inserted = self.dbi.insert_rows(
+                "apple pie", ["alice", "bonnie"], [(i, str(i)) for i in range(count)]
+            )
+            self.assertEqual(inserted, count)
+        self.assertEqual(
+            self.dbi.retrieve_rows('SELECT count(*) FROM "apple pie";'), [(857,)]
+        )
+
+    def test_update_rows_batched(self):
+        print(f"\n{'*'*20}{'Testing batched update':^40}{'*'*20}")
+        fields = self.dbi.get_all_table_fields("bananas foster")
+        self.dbi.insert_rows(
+            "bananas foster", fields, [(float(i), None, f"K{i}") for i in range(20)]
+        )
+        update_info = {
+            "keys": ["erin"],
+            "update fields": ["claire", "dave"],
+            "update values": ((("K{}".format(i),), (-1.0, "new")) for i in range(25)),
+        }
+        self.assertEqual(self.dbi.update_rows("bananas foster", update_info), 20)
+        results = self.dbi.retrieve_rows(
+            'SELECT count(*) FROM "bananas foster" WHERE claire = -1.0 AND dave = \'new\';'
+        )
+        self.assertEqual(results, [(20,)])
+
+    def test_delete_rows_batched(self):
+        print(f"\n{'*'*20}{'Testing batched deletion':^40}{'*'*20}")
+        fields = self.dbi.get_all_table_fields("banana details")
+        self.dbi.insert_rows(
+            "bananas foster", ["claire", "erin"], [(0.0, "A"), (1.0, "B")]
+        )
+        self.dbi.insert_rows(
+            "banana details",
+            fields,
+            [(key, i, 0.0, 0) for key in "AB" for i in range(30)],
+        )
+        doomed = [("A", i) for i in range(0, 30, 2)] + [("C", 0)]
+        deleted = self.dbi.delete_rows(
+            "banana details", ["fred rumors", "frank"], doomed, batch_size=4
+        )
+        self.assertEqual(deleted, 15)
+        deleted = self.dbi.delete_rows("banana details", ["fred rumors"], [("B",)])
+        self.assertEqual(deleted, 30)
+        results = self.dbi.retrieve_rows('SELECT count(*) FROM "banana details";')
+        self.assertEqual(results, [(15,)])
+
+    def test_iter_rows(self):
+        print(f"\n{'*'*20}{'Testing streaming retrieval':^40}{'*'*20}")
+        self.dbi.insert_rows(
+            "bananas foster", ["claire", "erin"], ((float(i), f"K{i:03d}") for i in range(250))
+        )
+        query = 'SELECT erin FROM "bananas foster" WHERE claire >= ? ORDER BY erin;'
+        batches = list(self.dbi.iter_rows(query, (10.0,), batch_size=100, batches=True))
+        self.assertEqual([len(b) for b in batches], [100, 100, 40])
+        rows = self.dbi.iter_rows(query, (10.0,), batch_size=7)
+        self.assertEqual(next(rows), ("K010",))
+        # The shared cursor remains usable mid-stream
+        self.assertEqual(len(self.dbi.retrieve_rows(query, (0.0,))), 250)
+        self.assertEqual(sum(1 for _ in rows), 239)
+
+    def test_columnar_fetch(self):
+        print(f"\n{'*'*20}{'Testing columnar retrieval':^40}{'*'*20}")
+        self.dbi.insert_rows("bananas foster", ["claire", "erin"], [(0.0, "A")])
+        fields = self.dbi.get_all_table_fields("banana details")
+        self.dbi.insert_rows(
+            "banana details",
+            fields,
+            [("A", i, i / 2, i if i % 3 else None) for i in range(2500)],
+        )
+        query = 'SELECT *, frank * 2 AS doubled FROM "banana details";'
+        columns = self.dbi.fetch_columns(query, batch_size=300)
+        self.assertEqual(columns["frank"].dtype, np.int64)
+        self.assertEqual(columns["gina"].dtype, np.float64)
+        self.assertEqual(columns["doubled"].dtype, np.int64)
+        # Integer field with NULLs is widened to floats
+        self.assertEqual(columns["herb"].dtype, np.float64)
+        self.assertEqual(int(np.isnan(columns["herb"]).sum()), 834)
+        self.assertEqual(len(columns["fred rumors"]), 2500)
+        chunks = list(self.dbi.iter_dataframes(query, chunksize=1000))
+        self.assertEqual([len(c) for c in chunks], [1000, 1000, 500])
+        self.assertEqual(chunks[0]["frank"].dtype, np.int64)
+
+    def test_columnar_fetch_mixed_storage_classes(self):
+        print(f"\n{'*'*20}{'Testing columnar mixed storage':^40}{'*'*20}")
+        self.dbi.insert_rows("bananas foster", ["claire", "erin"], [(0.0, "A")])
+        fields = self.dbi.get_all_table_fields("banana details")
+        # INTEGER fields may still store REAL and TEXT values
+        self.dbi.insert_rows(
+            "banana details",
+            fields,
+            [
+                ("A", 1, 0.0, 1),
+                ("A", 2, 0.0, 2.5),
+                ("A", 3, 0.0, 4.5),
+                ("A", 4, 0.0, "7x"),
+            ],
+        )
+        query = 'SELECT herb FROM "banana details" ORDER BY frank;'
+        expected = [row[0] for row in self.dbi.retrieve_rows(query)]
+        self.assertEqual(expected, [1, 2.5, 4.5, "7x"])
+        self.assertEqual(list(self.dbi.fetch_columns(query)["herb"]), expected)
+        for batch_size in (1, 2):
+            columns = self.dbi.fetch_columns(query, batch_size=batch_size)
+            self.assertEqual(list(columns["herb"]), expected)
+        frame = next(self.dbi.iter_dataframes(query))
+        self.assertEqual(list(frame["herb"]), expected)
+        query = 'SELECT herb FROM "banana details" WHERE frank < 4 ORDER BY frank;'
+        columns = self.dbi.fetch_columns(query)
+        self.assertEqual(columns["herb"].dtype, np.float64)
+        self.assertEqual(list(columns["herb"]), [1.0, 2.5, 4.5])
+
+    def test_query_cache(self):
+        print(f"\n{'*'*20}{'Testing query result cache':^40}{'*'*20}")
+        self.dbi.close()
+        self.config["cache entries"] = 2
+        self.dbi = SQLInterface(self.config)
+        self.dbi.insert_rows("bananas foster", ["claire", "erin"], [(1.0, "A")])
+        bananas = 'SELECT * FROM "bananas foster" WHERE claire = ?;'
+        apples = 'SELECT count(*) FROM "apple pie";'
+        self.assertEqual(len(self.dbi.retrieve_rows(bananas, (1.0,))), 1)
+        # Whitespace differences normalize to the same cache entry
+        reformatted = 'SELECT *  FROM "bananas foster"\n WHERE claire = ?'
+        self.assertEqual(len(self.dbi.retrieve_rows(reformatted, (1.0,))), 1)
+        self.dbi.retrieve_rows(apples)
+        self.assertEqual(self.dbi.cache_stats()["hits"], 1)
+        # Writes to an unrelated table leave cached results alone
+        self.dbi.insert_rows("apple pie", ["bonnie"], [("x",)])
+        self.assertEqual(self.dbi.cache_stats()["entries"], 1)
+        self.dbi.insert_rows("bananas foster", ["claire", "erin"], [(1.0, "B")])
+        self.assertEqual(self.dbi.cache_stats()["entries"], 0)
+        self.assertEqual(len(self.dbi.retrieve_rows(bananas, (1.0,))), 2)
+        self.dbi.execute_pandas_query(apples)
+        self.dbi.retrieve_rows(apples)
+        stats = self.dbi.cache_stats()
+        self.assertEqual((stats["entries"], stats["evictions"]), (2, 1))
+        # Reads inside a transaction see its uncommitted writes
+        with self.dbi.transaction():
+            self.dbi.insert_rows("bananas foster", ["claire", "erin"], [(1.0, "C")])
+            self.assertEqual(len(self.dbi.retrieve_rows(bananas, (1.0,))), 3)
+        self.assertEqual(len(self.dbi.retrieve_rows(bananas, (1.0,))), 3)
+
+    def test_lazy_metadata_cache(self):
+        print(f"\n{'*'*20}{'Testing lazy metadata cache':^40}{'*'*20}")
+        self.dbi.close()
+        self.config["metadata cache"] = True
+        self.dbi = SQLInterface(self.config)
+        tables = self.dbi.meta_info["tables"]
+        self.assertEqual(tables.loaded(), [])
+        self.assertEqual(
+            self.dbi.get_data_entry_fields("bananas foster"), (["erin"], ["claire"])
+        )
+        self.assertEqual(tables.loaded(), ["bananas foster"])
+        self.dbi.retrieve_metadata()
+        self.dbi.close()
+        cache_file = os.path.join(self.config["project dir"], "test.db.meta.json")
+        self.assertTrue(os.path.isfile(cache_file))
+
+        # Unchanged schema: everything is served from the cache file
+        self.dbi = SQLInterface(self.config)
+        tables = self.dbi.meta_info["tables"]
+        self.assertEqual(len(tables.loaded()), 3)
+        # Schema changes are picked up automatically
+        self.dbi.conn.execute('ALTER TABLE "apple pie" ADD COLUMN crumble INTEGER;')
+        self.assertIn("crumble", self.dbi.get_all_table_fields("apple pie"))
+        self.assertEqual(tables.loaded(), ["apple pie"])
+
+        # A recreated database with a different schema (but, possibly, the same
+        # schema version) is not served from the cache file
+        self.dbi.retrieve_metadata()
+        self.dbi.close()
+        version = sqlite3.connect(self.dbi.db).execute("PRAGMA schema_version;")
+        version = version.fetchone()[0]
+        os.remove(self.dbi.db)
+        db_config = os.path.join(self.config["project dir"], "test_db.sql")
+        with open(db_config) as fp:
+            schema = fp.read().replace("bonnie", "zed")
+        with sqlite3.connect(self.dbi.db) as conn:
+            conn.executescript(schema)
+            conn.execute('ALTER TABLE "apple pie" ADD COLUMN crumble INTEGER;')
+            self.assertEqual(
+                conn.execute("PRAGMA schema_version;").fetchone()[0], version
+            )
+        conn.close()
+        self.dbi = SQLInterface(self.config)
+        fields = self.dbi.get_all_table_fields("apple pie")
+        self.assertIn("zed", fields)
+        self.assertNotIn("bonnie", fields)
+
+    def test_upsert_rows(self):
+        print(f"\n{'*'*20}{'Testing upsert':^40}{'*'*20}")
+        fields = self.dbi.get_all_table_fields("bananas foster")
+        self.dbi.insert_rows(
+            "bananas foster", fields, [(1.0, "kept", "A"), (2.0, "kept", "B")]
+        )
+        rowids = self.dbi.retrieve_rows('SELECT rowid, erin FROM "bananas foster";')
+        upserts = ((key, 9.0) for key in "ABC")
+        written = self.dbi.upsert_rows(
+            "bananas foster", ["erin", "claire"], upserts, batch_size=2
+        )
+        self.assertEqual(written, 3)
+        results = self.dbi.retrieve_rows(
+            'SELECT rowid, claire, dave, erin FROM "bananas foster" ORDER BY erin;'
+        )
+        self.assertEqual(
+            [r[1:] for r in results],
+            [(9.0, "kept", "A"), (9.0, "kept", "B"), (9.0, None, "C")],
+        )
+        # Existing rows were updated in place
+        self.assertEqual([(r[0], r[3]) for r in results[:2]], rowids)
+        with self.assertRaises(ValueError):
+            self.dbi.upsert_rows("apple pie", ["bonnie"], [("A",)])
+
+    def test_instrumentation(self):
+        print(f"\n{'*'*20}{'Testing statement instrumentation':^40}{'*'*20}")
+        self.dbi.close()
+        self.config["slow query ms"] = 0
+        self.dbi = SQLInterface(self.config)
+        self.dbi.insert_rows(
+            "bananas foster", ["claire", "erin"], [(0.0, "A"), (1.0, "B")]
+        )
+        query = 'SELECT * FROM "bananas foster" WHERE erin = ?;'
+        self.dbi.retrieve_rows(query, ("A",))
+        self.assertEqual(list(self.dbi.iter_rows('SELECT * FROM "apple pie";')), [])
+        stats = self.dbi.stats()
+        inserts = stats["statements"]["insert bananas foster"]
+        self.assertEqual((inserts["calls"], inserts["rows"]), (1, 2))
+        self.assertLessEqual(inserts["p50 s"], inserts["max s"])
+        self.assertEqual(stats["statements"]["select bananas foster"]["rows"], 1)
+        self.assertEqual(stats["statements"]["select apple pie"]["calls"], 1)
+        plans = [entry["plan"] for entry in stats["slow queries"] if entry["plan"]]
+        self.assertIn("USING", plans[0][0])
+
+    def test_index_advisor(self):
+        print(f"\n{'*'*20}{'Testing index advisor':^40}{'*'*20}")
+        self.dbi.close()
+        self.config.update({"index advisor": True, "index advisor rows": 100})
+        self.dbi = SQLInterface(self.config)
+        self.dbi.insert_rows("bananas foster", ["claire", "erin"], [(0.0, "A")])
+        fields = self.dbi.get_all_table_fields("banana details")
+        self.dbi.insert_rows(
+            "banana details", fields, [("A", i, i % 7, i % 11) for i in range(500)]
+        )
+        query = 'SELECT frank FROM "banana details" WHERE herb = ? AND gina > ?;'
+        self.dbi.retrieve_rows(query, (3, 2.0))
+        self.dbi.retrieve_rows('SELECT * FROM "banana details" ORDER BY herb;')
+        self.dbi.retrieve_rows('SELECT * FROM "bananas foster" WHERE claire = 0;')
+        suggestions = self.dbi.suggest_indexes()
+        self.assertEqual(
+            [s["columns"] for s in suggestions], [["herb", "gina", "frank"], ["herb"]]
+        )
+        report = self.dbi.apply_index_suggestions(suggestions[:1])
+        self.assertIn("COVERING INDEX", report[0]["queries"][0]["plan"][0])
+        # The new index also serves the ORDER BY, so no scans remain
+        self.assertEqual(self.dbi.suggest_indexes(), [])
+
+    def test_import_csv(self):
+        print(f"\n{'*'*20}{'Testing streaming CSV import':^40}{'*'*20}")
+        self.dbi.conn.execute('CREATE INDEX "by gina" ON "banana details" (gina);')
+        self.dbi.insert_rows("bananas foster", ["claire", "erin"], [(0.0, "A")])
+        csv_path = os.path.join(self.config["project dir"], "details.csv")
+        with open(csv_path, "w") as fp:
+            fp.write("id,counter,value,rounded,ignored\n")
+            for i in range(1000):
+                fp.write(f"A,{i},{i / 4},{'' if i % 2 else i},x\n")
+        column_map = {"id": "fred rumors", "counter": "frank", "value": "gina"}
+        column_map["rounded"] = "herb"
+        written = self.dbi.import_csv(
+            "banana details",
+            csv_path,
+            chunksize=300,
+            column_map=column_map,
+            commit_rows=500,
+            rebuild_indexes=True,
+        )
+        self.assertEqual(written, 1000)
+        results = self.dbi.retrieve_rows(
+            'SELECT frank, gina, herb, typeof(herb) FROM "banana details" '
+            "WHERE frank IN (2, 3) ORDER BY frank;"
+        )
+        self.assertEqual(results, [(2, 0.5, 2, "integer"), (3, 0.75, None, "null")])
+        indexes = self.dbi.retrieve_rows(
+            "SELECT name FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL;"
+        )
+        self.assertEqual(indexes, [("by gina",)])
+
+    def test_import_keeps_unique_indexes(self):
+        print(f"\n{'*'*20}{'Testing import index rebuilds':^40}{'*'*20}")
+        self.dbi.conn.execute('CREATE UNIQUE INDEX "one bonnie" ON "apple pie" (bonnie);')
+        self.dbi.conn.execute('CREATE INDEX "by bob" ON "apple pie" (bob);')
+        self.dbi.insert_rows("apple pie", ["bonnie", "bob"], [("x", "old")])
+        frame = pd.DataFrame({"bonnie": ["x", "y"], "bob": ["new", "other"]})
+        written = self.dbi.import_dataframe("apple pie", frame, rebuild_indexes=True)
+        self.assertEqual(written, 2)
+        rows = 'SELECT bonnie, bob FROM "apple pie" ORDER BY bonnie;'
+        # The unique index was kept, so the conflicting row was replaced
+        self.assertEqual(self.dbi.retrieve_rows(rows), [("x", "new"), ("y", "other")])
+        indexes = (
+            "SELECT name FROM sqlite_master "
+            "WHERE type = 'index' AND sql IS NOT NULL ORDER BY name;"
+        )
+        self.assertEqual(self.dbi.retrieve_rows(indexes), [("by bob",), ("one bonnie",)])
+        # A failed load is rolled back along with the index drops
+        frame = pd.DataFrame({"bonnie": ["z", None], "bob": ["a", "b"]})
+        with self.assertRaises(IntegrityError):
+            self.dbi.import_dataframe("apple pie", frame, rebuild_indexes=True)
+        self.assertEqual(self.dbi.retrieve_rows(rows), [("x", "new"), ("y", "other")])
+        self.assertEqual(self.dbi.retrieve_rows(indexes), [("by bob",), ("one bonnie",)])
+
+    def test_backup_and_export(self):
+        print(f"\n{'*'*20}{'Testing backup and export':^40}{'*'*20}")
+        fields = self.dbi.get_all_table_fields("bananas foster")
+        rows = [(float(i), bytes([i]), f"K{i:03d}") for i in range(100)]
+        self.dbi.insert_rows("bananas foster", fields, rows)
+        steps = []
+        self.dbi.backup("backup.db", pages=1, progress=lambda *a: steps.append(a))
+        self.assertGreater(len(steps), 1)
+        self.assertEqual(steps[-1][1], 0)
+        backup = SQLInterface({**self.config, "db file": "backup.db"})
+        self.assertEqual(backup.retrieve_rows('SELECT * FROM "bananas foster";'), rows)
+        backup.close()
+
+        progress = []
+        written = self.dbi.export_rows(
+            "bananas foster", "bananas.jsonl", batch_size=30, progress=progress.append
+        )
+        self.assertEqual((written, progress), (100, [30, 60, 90, 100]))
+        with open(os.path.join(self.config["project dir"], "bananas.jsonl")) as fp:
+            first = json.loads(fp.readline())
+        self.assertEqual(first, {"claire": 0.0, "dave": "AA==", "erin": "K000"})
+        query = 'SELECT erin, claire FROM "bananas foster" WHERE claire < ?;'
+        self.dbi.export_rows(query, "bananas.csv", params=(2,))
+        with open(os.path.join(self.config["project dir"], "bananas.csv")) as fp:
+            lines = fp.read().splitlines()
+        self.assertEqual(lines, ["erin,claire", "K000,0.0", "K001,1.0"])
+
+    def test_parallel_scan(self):
+        print(f"\n{'*'*20}{'Testing parallel range scans':^40}{'*'*20}")
+        fields = self.dbi.get_all_table_fields("bananas foster")
+        rows = [(float(i), None, f"K{i:03d}") for i in range(100)]
+        self.dbi.insert_rows("bananas foster", fields, rows)
+        scanned = self.dbi.parallel_scan("bananas foster", partitions=3)
+        self.assertEqual(sorted(scanned, key=lambda r: r[2]), rows)
+        total = self.dbi.parallel_scan(
+            "bananas foster",
+            'SELECT sum(claire), count(*) FROM "bananas foster" WHERE {partition};',
+            partitions=4,
+            reduce=lambda a, b: [(a[0][0] + b[0][0], a[0][1] + b[0][1])],
+        )
+        self.assertEqual(total, [(4950.0, 100)])
+
+        conn = sqlite3.connect(self.dbi.db)
+        conn.execute("CREATE TABLE keyed (k TEXT PRIMARY KEY, v INTEGER) WITHOUT ROWID;")
+        conn.executemany("INSERT INTO keyed VALUES (?, ?);", [(r[2], 1) for r in rows])
+        conn.commit()
+        conn.close()
+        counts = self.dbi.parallel_scan(
+            "keyed", "SELECT count(*) FROM keyed WHERE {partition};", partitions=3
+        )
+        self.assertEqual(len(counts), 3)
+        self.assertEqual(sum(count for count, in counts), 100)
+
+    def test_change_capture(self):
+        print(f"\n{'*'*20}{'Testing change-data capture':^40}{'*'*20}")
+        self.dbi.enable_change_capture(["bananas foster", "apple pie"])
+        fields = self.dbi.get_all_table_fields("bananas foster")
+        self.dbi.insert_rows("bananas foster", fields, [(0.0, None, "A"), (1.0, None, "B")])
+        self.dbi.insert_rows("apple pie", ["bonnie"], [("pie",)])
+        self.dbi.update_rows(
+            "bananas foster",
+            {"keys": ["erin"], "update fields": ["claire"], "update values": [(("A",), (2.0,))]},
+        )
+        self.dbi.delete_rows("bananas foster", ["erin"], [("B",)])
+        changes = list(self.dbi.changes_since(0))
+        self.assertEqual(
+            [change[1:4] for change in changes],
+            [
+                ("bananas foster", "insert", ["A"]),
+                ("bananas foster", "insert", ["B"]),
+                ("apple pie", "insert", [1]),
+                ("bananas foster", "update", ["A"]),
+                ("bananas foster", "delete", ["B"]),
+            ],
+        )
+        recent = list(self.dbi.changes_since(changes[2][0], tables=["bananas foster"]))
+        self.assertEqual([change[2] for change in recent], ["update", "delete"])
+
+        self.assertEqual(self.dbi.prune_changes(), 0)
+        self.dbi.acknowledge("reports", changes[1][0])
+        self.dbi.acknowledge("search", changes[2][0])
+        self.assertEqual(self.dbi.prune_changes(), 2)
+        self.dbi.delete_rows("bananas foster", ["erin"], [("A",)])
+        self.assertEqual(self.dbi.prune_changes(compact=True), 1)
+        self.assertEqual(
+            [change[2:4] for change in self.dbi.changes_since(0)],
+            [("insert", [1]), ("delete", ["B"]), ("delete", ["A"])],
+        )
+        self.dbi.disable_change_capture()
+        self.dbi.insert_rows("apple pie", ["bonnie"], [("tart",)])
+        self.assertEqual(len(list(self.dbi.changes_since(0))), 3)
+
+    def test_change_capture_instrumented(self):
+        print(f"\n{'*'*20}{'Testing instrumented change capture':^40}{'*'*20}")
+        self.dbi.close()
+        self.dbi = SQLInterface(
+            {**self.config, "instrumentation": True, "change capture": True}
+        )
+        self.dbi.insert_rows("apple pie", ["bonnie"], [("pie",)])
+        self.assertEqual(len(list(self.dbi.changes_since(0))), 1)
+        self.dbi.disable_change_capture()
+        schema = self.dbi.stats()["statements"]["schema change log"]
+        self.assertEqual((schema["calls"], schema["rows"]), (3, 0))
+
+    def test_change_capture_cached(self):
+        print(f"\n{'*'*20}{'Testing cached change capture':^40}{'*'*20}")
+        self.dbi.close()
+        self.dbi = SQLInterface(
+            {**self.config, "cache entries": 16, "change capture": ["apple pie"]}
+        )
+        count = 'SELECT count(*) FROM "change log";'
+        self.assertEqual(self.dbi.retrieve_rows(count), [(0,)])
+        self.dbi.insert_rows("apple pie", ["bonnie"], [("pie",)])
+        # The capture trigger's write to the change log is not served stale
+        self.assertEqual(self.dbi.retrieve_rows(count), [(1,)])
+        with self.dbi.transaction():
+            self.dbi.insert_rows("apple pie", ["bonnie"], [("tart",)])
+        self.assertEqual(self.dbi.retrieve_rows(count), [(2,)])
+        self.dbi.disable_change_capture()
+        self.dbi.insert_rows("apple pie", ["bonnie"], [("crumble",)])
+        self.assertEqual(self.dbi.retrieve_rows(count), [(2,)])
+
+    def test_in_memory(self):
+        print(f"\n{'*'*20}{'Testing in-memory mode':^40}{'*'*20}")
+        fields = self.dbi.get_all_table_fields("bananas foster")
+        self.dbi.insert_rows("bananas foster", fields, [(0.0, None, "on disk")])
+        query = 'SELECT erin FROM "bananas foster" ORDER BY erin;'
+        memory = SQLInterface({**self.config, "in memory": True, "persist changes": 2})
+        self.assertEqual(memory.retrieve_rows(query), [("on disk",)])
+        memory.insert_rows("bananas foster", fields, [(1.0, None, "in memory")])
+        self.assertEqual(len(self.dbi.retrieve_rows(query)), 1)
+        memory.insert_rows("bananas foster", fields, [(2.0, None, "persisted")])
+        for _ in range(50):
+            if len(self.dbi.retrieve_rows(query)) == 3:
+                break
+            time.sleep(0.05)
+        self.assertEqual(len(self.dbi.retrieve_rows(query)), 3)
+        memory.delete_rows("bananas foster", ["erin"], [("on disk",)])
+        memory.close()
+        self.assertEqual(
+            self.dbi.retrieve_rows(query), [("in memory",), ("persisted",)]
+        )
+
+        config = {**temporary_config(self.__class__.test_path), "in memory": True}
+        created = SQLInterface(config)
+        created.insert_rows("apple pie", ["bonnie"], [("pie",)])
+        self.assertFalse(os.path.isfile(created.db))
+        created.close()
+        reopened = SQLInterface({**config, "in memory": False})
+        self.assertEqual(reopened.retrieve_rows('SELECT bonnie FROM "apple pie";'), [("pie",)])
+        reopened.close()
+        shutil.rmtree(config["project dir"], ignore_errors=True)
+
+    def test_blob_store(self):
+        print(f"\n{'*'*20}{'Testing the blob store':^40}{'*'*20}")
+        blobs = self.dbi.blobs
+        accession = blobs.put(b"payload" * 1000)
+        self.assertEqual(blobs.put(io.BytesIO(b"payload" * 1000)), accession)
+        path = blobs.path(accession)
+        self.assertEqual(
+            path,
+            os.path.join(
+                self.config["project dir"], "DB", accession[:2], accession[2:4], accession
+            ),
+        )
+        with blobs.open(accession) as view:
+            self.assertEqual(view[:7], b"payload")
+            self.assertEqual(len(view), 7000)
+        self.assertEqual(self.dbi.blobs.lookup(accession)[1::2], (7000, 2))
+        self.assertEqual(blobs.get(blobs.put(b"")), b"")
+        self.assertFalse(blobs.delete(accession))
+        self.assertIn(accession, blobs)
+        self.assertTrue(blobs.delete(accession))
+        self.assertNotIn(accession, blobs)
+        self.assertIsNone(blobs.lookup(accession))
+
+    def test_transaction(self):
+        print(f"\n{'*'*20}{'Testing grouped transactions':^40}{'*'*20}")
+        with self.dbi.transaction():
+            self.dbi.insert_rows("bananas foster", ["claire", "erin"], [(0.0, "A")])
+            self.dbi.insert_rows("apple pie", ["bonnie"], [("A",)])
+        with self.assertRaises(IntegrityError):
+            with self.dbi.transaction():
+                self.dbi.insert_rows("apple pie", ["bonnie"], [("B",)])
+                self.dbi.insert_rows("apple pie", ["bob"], [("no bonnie",)])
+        self.assertEqual(
+            self.dbi.retrieve_rows('SELECT bonnie FROM "apple pie";'), [("A",)]
+        )
+
+
+class TestWriteBuffer(unittest.TestCase):
+
+    test_path = Path(__file__).resolve().parent
+
+    def setUp(self):
+        self.config = temporary_config(self.__class__.test_path)
+        self.config.update({"write buffer": True, "flush interval ms": 10000})
+        self.dbi = SQLInterface(self.config)
+
+    def tearDown(self):
+        self.dbi.close()
+        shutil.rmtree(self.config["project dir"], ignore_errors=True)
+
+    def test_buffered_writes(self):
+        print(f"\n{'*'*20}{'Testing buffered writes':^40}{'*'*20}")
+        query = 'SELECT count(*) FROM "bananas foster";'
+        futures = [
+            self.dbi.insert_rows("bananas foster", ["claire", "erin"], [(0.0, f"K{i}")])
+            for i in range(10)
+        ]
+        self.assertEqual(self.dbi.retrieve_rows(query), [(0,)])
+        self.dbi.flush()
+        self.assertEqual([f.result() for f in futures], [1] * 10)
+        self.assertEqual(self.dbi.retrieve_rows(query), [(10,)])
+
+    def test_buffered_errors(self):
+        print(f"\n{'*'*20}{'Testing buffered write errors':^40}{'*'*20}")
+        good = self.dbi.insert_rows("apple pie", ["bonnie"], [("fine",)])
+        with self.dbi.transaction():
+            self.dbi.insert_rows("apple pie", ["bonnie"], [("discarded",)])
+            bad = self.dbi.insert_rows("apple pie", ["bob"], [("no bonnie",)])
+        with self.assertRaises(IntegrityError):
+            self.dbi.flush()
+        self.assertEqual(good.result(), 1)
+        self.assertIsInstance(bad.exception(), IntegrityError)
+        self.assertEqual(
+            self.dbi.retrieve_rows('SELECT bonnie FROM "apple pie";'), [("fine",)]
+        )
+
+    def test_flush_while_streaming(self):
+        print(f"\n{'*'*20}{'Testing flushes mid-stream':^40}{'*'*20}")
+        self.dbi.insert_rows(
+            "bananas foster", ["claire", "erin"], [(0.0, f"K{i:02d}") for i in range(30)]
+        )
+        self.dbi.flush()
+        query = 'SELECT erin FROM "bananas foster" ORDER BY erin;'
+        streamed = []
+
+        def stream():
+            for rows in self.dbi.iter_rows(query, batch_size=10, batches=True):
+                streamed.append(len(rows))
+                self.dbi.insert_rows("apple pie", ["bonnie"], [(rows[0][0],)])
+                self.dbi.flush()
+            self.dbi.export_rows(
+                query, "export.csv", batch_size=10, progress=lambda _: self.dbi.flush()
+            )
+
+        # Writes and flushes between batches must not wait on the paused stream
+        thread = threading.Thread(target=stream, daemon=True)
+        thread.start()
+        thread.join(timeout=10)
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(streamed, [10, 10, 10])
+        self.assertEqual(
+            self.dbi.retrieve_rows('SELECT bonnie FROM "apple pie" ORDER BY bonnie;'),
+            [("K00",), ("K10",), ("K20",)],
+        )
+
+    def test_drain_on_close(self):
+        print(f"\n{'*'*20}{'Testing write buffer shutdown':^40}{'*'*20}")
+        future = self.dbi.delete_rows("apple pie", ["bonnie"], [("nothing",)])
+        self.dbi.insert_rows("apple pie", ["bonnie"], iter([("A",), ("B",)]))
+        self.dbi.close()
+        self.assertEqual(future.result(), 0)
+        self.dbi = SQLInterface({**self.config, "write buffer": False})
+        self.assertEqual(
+            self.dbi.retrieve_rows('SELECT count(*) FROM "apple pie";'), [(2,)]
+        )
+
+
+class TestPooledInterface(unittest.TestCase):
+
+    test_path = Path(__file__).resolve().parent
+
+    def setUp(self):
+        self.config = temporary_config(self.__class__.test_path)
+        self.config["pool size"] = 4
+        self.dbi = SQLInterface(self.config)
+
+    def tearDown(self):
+        self.dbi.close()
+        shutil.rmtree(self.config["project dir"], ignore_errors=True)
+
+    def test_concurrent_readers(self):
+        print(f"\n{'*'*20}{'Testing pooled concurrent reads':^40}{'*'*20}")
+        self.assertEqual(self.dbi.retrieve_rows("PRAGMA journal_mode;"), [("wal",)])
+        query = 'SELECT count(*) FROM "bananas foster";'
+
+        def write(i):
+            return self.dbi.insert_rows("bananas foster", ["claire", "erin"], [(0.0, f"K{i}")])
+
+        def read(i):
+            return self.dbi.retrieve_rows(query)[0][0]
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            writes = list(executor.map(write, range(50)))
+            counts = list(executor.map(read, range(50)))
+        self.assertEqual(sum(writes), 50)
+        self.assertTrue(all(c == 50 for c in counts))
+        self.assertLessEqual(len(self.dbi.pool._connections), 4)
+
+
+class TestAsyncInterface(unittest.TestCase):
+
+    test_path = Path(__file__).resolve().parent
+
+    def setUp(self):
+        self.config = temporary_config(self.__class__.test_path)
+
+    def tearDown(self):
+        shutil.rmtree(self.config["project dir"], ignore_errors=True)
+
+    def test_async_round_trip(self):
+        print(f"\n{'*'*20}{'Testing asyncio front-end':^40}{'*'*20}")
+
+        async def round_trip():
+            async with AsyncSQLInterface(self.config) as dbi:
+                fields = await dbi.get_all_table_fields("bananas foster")
+                rows = [(float(i), None, f"K{i:03d}") for i in range(30)]
+                inserted = await dbi.insert_rows("bananas foster", fields, rows)
+                query = 'SELECT erin FROM "bananas foster" ORDER BY erin;'
+                streamed = [row async for row in dbi.iter_rows(query, batch_size=8)]
+                frame = await dbi.execute_pandas_query(query)
+                return inserted, streamed, len(frame)
+
+        inserted, streamed, frame_length = asyncio.run(round_trip())
+        self.assertEqual(inserted, 30)
+        self.assertEqual(streamed[0], ("K000",))
+        self.assertEqual(len(streamed), 30)
+        self.assertEqual(frame_length, 30)
+
+
+class TestShardedInterface(unittest.TestCase):
+
+    test_path = Path(__file__).resolve().parent
+
+    def setUp(self):
+        self.config = {
+            **temporary_config(self.__class__.test_path),
+            "shards": 3,
+            "shard keys": {"banana details": ["fred rumors"]},
+        }
+        self.dbi = ShardedSQLInterface(self.config)
+
+    def tearDown(self):
+        self.dbi.close()
+        shutil.rmtree(self.config["project dir"], ignore_errors=True)
+
+    def test_sharded_round_trip(self):
+        print(f"\n{'*'*20}{'Testing sharded interface':^40}{'*'*20}")
+        fields = self.dbi.get_all_table_fields("bananas foster")
+        rows = [(float(i), None, f"K{i:03d}") for i in range(60)]
+        self.assertEqual(self.dbi.insert_rows("bananas foster", fields, rows), 60)
+        for i in range(3):
+            self.assertTrue(
+                os.path.isfile(os.path.join(self.config["project dir"], f"test.shard{i}.db"))
+            )
+        query = 'SELECT * FROM "bananas foster" ORDER BY erin;'
+        per_shard = self.dbi.retrieve_rows(query, merge=lambda parts: parts)
+        self.assertTrue(all(0 < len(part) < 60 for part in per_shard))
+        self.assertEqual(self.dbi.retrieve_rows(query, sort_key=lambda r: r[2]), rows)
+        count = self.dbi.retrieve_rows(
+            'SELECT count(*) FROM "bananas foster";',
+            merge=lambda parts: sum(part[0][0] for part in parts),
+        )
+        self.assertEqual(count, 60)
+
+        details = [(f"K{i:03d}", j, 0.5, j) for i in range(10) for j in range(3)]
+        self.dbi.insert_rows(
+            "banana details", self.dbi.get_all_table_fields("banana details"), details
+        )
+        joined = self.dbi.retrieve_rows(
+            'SELECT count(*) FROM "banana details" JOIN "bananas foster" '
+            'ON "fred rumors" = erin;',
+            merge=lambda parts: sum(part[0][0] for part in parts),
+        )
+        self.assertEqual(joined, 30)
+
+        updated = self.dbi.update_rows(
+            "bananas foster",
+            {
+                "keys": ["erin"],
+                "update fields": ["claire"],
+                "update values": [(("K051",), (-1.0,)), (("K052",), (-2.0,))],
+            },
+        )
+        self.assertEqual(updated, 2)
+        self.assertEqual(self.dbi.delete_rows("bananas foster", ["claire"], [(-1.0,)]), 1)
+        self.assertEqual(self.dbi.delete_rows("bananas foster", ["erin"], [("K052",)]), 1)
+        self.assertEqual(len(list(self.dbi.iter_rows(query, batch_size=7))), 58)
+        self.assertEqual(len(self.dbi.execute_pandas_query(query)), 58)
+        self.dbi.vacuum()
+
+    def test_keyless_table(self):
+        print(f"\n{'*'*20}{'Testing sharded keyless tables':^40}{'*'*20}")
+        self.assertEqual(self.dbi.shard_fields("apple pie"), [])
+        self.assertEqual(self.dbi.insert_rows("apple pie", ["bonnie"], [("A",)]), 1)
+        self.assertEqual(
+            self.dbi.insert_rows("apple pie", ["bonnie"], [(c,) for c in "BCDEF"]), 5
+        )
+        query = 'SELECT bonnie FROM "apple pie" ORDER BY bonnie;'
+        per_shard = self.dbi.retrieve_rows(query, merge=lambda parts: parts)
+        self.assertEqual([len(part) for part in per_shard], [2, 2, 2])
+        self.assertEqual(
+            self.dbi.retrieve_rows(query, sort_key=lambda r: r[0]),
+            [(c,) for c in "ABCDEF"],
+        )
+        updated = self.dbi.update_rows(
+            "apple pie",
+            {
+                "keys": ["bonnie"],
+                "update fields": ["bob"],
+                "update values": [(("A",), ("x",)), (("E",), ("y",))],
+            },
+        )
+        self.assertEqual(updated, 2)
+        self.assertEqual(self.dbi.delete_rows("apple pie", ["bob"], [("x",), ("y",)]), 2)
+        self.assertEqual(len(self.dbi.retrieve_rows(query)), 4)
+
+    def test_shard_key_types(self):
+        print(f"\n{'*'*20}{'Testing shard key normalization':^40}{'*'*20}")
+        # Keys are hashed as stored, given the column's affinity
+        for affinity, equal in (
+            ("TEXT", [5, np.int64(5), "5"]),
+            ("TEXT", [1, True, np.bool_(True), "1"]),
+            ("INTEGER", [5, np.int64(5), 5.0, np.float32(5.0), "5", " 5 ", "5.0"]),
+            ("REAL", [5, 5.0, "5", "5e0"]),
+            ("BLOB", [5, 5.0, np.int64(5)]),
+        ):
+            self.assertEqual(
+                len({_shard_value(value, affinity) for value in equal}), 1, equal
+            )
+        self.assertEqual(_shard_value(5.0, "TEXT"), "5.0")
+        self.assertEqual(_shard_value("5", "BLOB"), "5")
+        self.assertEqual(_shard_value("5x", "INTEGER"), "5x")
+        self.assertEqual(_shard_value(5.5, "INTEGER"), 5.5)
+
+        # "0" and 0 are the same TEXT key, so are routed to the same shard
+        fields = ["claire", "erin"]
+        self.dbi.insert_rows("bananas foster", fields, [(1.0, 0)])
+        self.dbi.upsert_rows("bananas foster", ["erin", "claire"], [("0", 2.0)])
+        self.assertEqual(
+            self.dbi.retrieve_rows('SELECT claire, erin FROM "bananas foster";'),
+            [(2.0, "0")],
+        )
+        self.assertEqual(self.dbi.delete_rows("bananas foster", ["erin"], [("0",)]), 1)
+
+
 if __name__ == "__main__":
     unittest.main()